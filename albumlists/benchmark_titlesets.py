@@ -0,0 +1,95 @@
+"""
+Compares titlesets.py against the per-letter list.remove loops that list3 and
+list_category used to do, on synthetic lists of titles.
+"""
+import argparse
+import random
+import string
+import time
+
+from titlesets import difference, intersection, key_on_first_letter
+
+def legacy_difference(album_pages, infoboxed_pages):
+    """What list3 used to do, on lists keyed on first letter."""
+    for letter in album_pages:
+        if letter not in infoboxed_pages:
+            continue
+
+        for album in album_pages[letter]:
+            if album in infoboxed_pages[letter]:
+                album_pages[letter].remove(album)
+                infoboxed_pages[letter].remove(album)
+    return album_pages
+
+def legacy_intersection(album_covers, other_dict):
+    """What list_category used to do, on lists keyed on first letter."""
+    result_list = {}
+    for letter in album_covers:
+        if letter not in other_dict:
+            continue
+
+        for album_cover in album_covers[letter]:
+            if album_cover in other_dict[letter]:
+                result_list[letter] = result_list.get(letter, []) +\
+                                      [album_cover]
+                other_dict[letter].remove(album_cover)
+    return result_list
+
+def make_titles(size, rng):
+    """Make size distinct title-like strings."""
+    titles = set()
+    while len(titles) < size:
+        titles.add(rng.choice(string.ascii_uppercase) + "".join(
+            rng.choice(string.ascii_lowercase + " ")
+            for _ in range(rng.randint(4, 20))))
+    return list(titles)
+
+def timed(label, function):
+    """Times one way of comparing the lists, returning what it came up with."""
+    start = time.time()
+    result = function()
+    print("%-36s %8.3f s" % (label, time.time() - start))
+    return result
+
+def count(keyed):
+    """The number of titles in a dict keyed on first letter."""
+    return sum(len(titles) for titles in keyed.values())
+
+def main():
+    "The main function."
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-s", "--size", type=int, default=200000,
+                        help="Number of titles in each list.")
+    parser.add_argument("--skip-legacy", action="store_true",
+                        help="Don't time the old code (it's very slow).")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    titles = make_titles(args.size * 3 // 2, rng)
+    album_pages = titles[:args.size]
+    infoboxed_pages = titles[-args.size:]
+    rng.shuffle(album_pages)
+    rng.shuffle(infoboxed_pages)
+    print("Two lists of %d titles, %d in both." %
+          (args.size, 2 * args.size - len(titles)))
+
+    new_difference = timed("titlesets difference", lambda: key_on_first_letter(
+        difference(iter(album_pages), iter(infoboxed_pages))))
+    new_intersection = timed("titlesets intersection", lambda: key_on_first_letter(
+        intersection(iter(album_pages), iter(infoboxed_pages))))
+    if args.skip_legacy:
+        return
+
+    old_difference = timed("list3 loop (difference)", lambda: legacy_difference(
+        key_on_first_letter(album_pages), key_on_first_letter(infoboxed_pages)))
+    old_intersection = timed("list_category loop (intersection)",
+                             lambda: legacy_intersection(
+                                 key_on_first_letter(album_pages),
+                                 key_on_first_letter(infoboxed_pages)))
+    print("Difference: %d titles, old code left %d." %
+          (count(new_difference), count(old_difference)))
+    print("Intersection: %d titles, old code found %d." %
+          (count(new_intersection), count(old_intersection)))
+
+if __name__ == "__main__":
+    main()
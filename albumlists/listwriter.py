@@ -0,0 +1,67 @@
+"""
+Writes maintenance lists out as wikitext a line at a time, splitting them
+into numbered subpages when they get too big for one wiki page.
+"""
+from datetime import date
+import io
+
+from titlesets import key_on_first_letter
+
+# The wiki won't save pages over 2 MB, so leave some room
+PAGE_LIMIT = 2000 * 1024
+
+CONTINUED = u"\n\n''Continued at [[/%d]]''"
+
+def wikitext_chunks(pages):
+    """
+    Yields the wikitext of a list of pages in chunks of (at most) a line.
+    Flat lists more than 15 pages long get keyed on first letter, and
+    dicts get a section per key.
+    """
+    if isinstance(pages, list) and len(pages) > 15:
+        pages = key_on_first_letter(pages)
+
+    if not hasattr(pages, "items"):
+        for page in pages:
+            yield u"\n* [[%s]]" % page
+        return
+
+    yield u"Last updated: %s" % date.strftime(date.today(), "%-d %B %Y")
+    if not pages:
+        yield u"\n\n(no items)"
+        return
+
+    for letter, letter_pages in sorted(pages.items()):
+        yield u"\n\n=== %s ===" % letter
+        for page in letter_pages:
+            yield u"\n* [[%s]]" % page
+
+def write_list(pages, text_file, save_page, page_limit=PAGE_LIMIT):
+    """
+    Writes the wikitext list of pages to text_file (all of it) and to
+    save_page(number, text), one wiki page's worth at a time. Page 1 is the
+    list's main page and 2, 3... are its subpages. Returns how many wiki
+    pages there were.
+    """
+    number = 1
+    page_text = io.StringIO()
+    page_size = 0
+    for chunk in wikitext_chunks(pages):
+        text_file.write(chunk)
+
+        chunk_size = len(chunk.encode("utf-8"))
+        room_needed = len((CONTINUED % (number + 1)).encode("utf-8"))
+        if page_size and page_size + chunk_size + room_needed > page_limit:
+            page_text.write(CONTINUED % (number + 1))
+            save_page(number, page_text.getvalue())
+            number += 1
+            page_text = io.StringIO()
+            page_size = 0
+            chunk = chunk.lstrip(u"\n")
+            chunk_size = len(chunk.encode("utf-8"))
+
+        page_text.write(chunk)
+        page_size += chunk_size
+
+    save_page(number, page_text.getvalue())
+    return number
@@ -0,0 +1,48 @@
+import io
+import unittest
+
+from listwriter import CONTINUED, write_list
+
+class TestWriteList(unittest.TestCase):
+    def write(self, pages, page_limit):
+        saved = []
+        text_file = io.StringIO()
+        count = write_list(pages, text_file,
+                           lambda number, text: saved.append((number, text)),
+                           page_limit=page_limit)
+        self.assertEqual(count, len(saved))
+        return text_file.getvalue(), saved
+
+    def test_short_list(self):
+        text, saved = self.write([u"A", u"B"], 1000)
+        self.assertEqual(text, u"\n* [[A]]\n* [[B]]")
+        self.assertEqual(saved, [(1, text)])
+
+    def test_sections(self):
+        text, _ = self.write({u"A": [u"Aa", u"Ab"], u"B": [u"Ba"]}, 1000)
+        self.assertTrue(text.endswith(
+            u"\n\n=== A ===\n* [[Aa]]\n* [[Ab]]\n\n=== B ===\n* [[Ba]]"))
+
+    def test_no_items(self):
+        text, _ = self.write({}, 1000)
+        self.assertTrue(text.endswith(u"\n\n(no items)"))
+
+    def test_split(self):
+        pages = [u"Album %d" % i for i in range(300)]
+        text, saved = self.write(pages, 1000)
+        self.assertTrue(len(saved) > 1)
+        self.assertEqual([number for number, _ in saved],
+                         list(range(1, len(saved) + 1)))
+        for number, page_text in saved:
+            self.assertTrue(len(page_text.encode("utf-8")) <= 1000)
+            if number < len(saved):
+                self.assertTrue(page_text.endswith(CONTINUED % (number + 1)))
+
+        # Every line of the full list ends up on exactly one page
+        lines = [line for _, page_text in saved
+                 for line in page_text.split(u"\n") if line.startswith(u"*")]
+        self.assertEqual(lines, [line for line in text.split(u"\n")
+                                 if line.startswith(u"*")])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import shutil
+import tempfile
+import unittest
+
+from titlecache import TitleCache
+from titlesets import (difference, intersection, key_on_first_letter,
+                       matching_titles)
+
+class FakeCategoryApi(object):
+    """Hands out category members 500 per request, counting the requests."""
+    def __init__(self, members):
+        self.members = members
+        self.requests = 0
+
+    def members_of(self, category):
+        for start in range(0, len(self.members.get(category, [])), 500):
+            self.requests += 1
+            for title in self.members[category][start:start + 500]:
+                yield (title, title.partition(":")[2])
+
+class TestTitleSets(unittest.TestCase):
+    def test_difference(self):
+        self.assertEqual(list(difference(iter("abcab"), iter("b"))),
+                         ["a", "c", "a"])
+
+    def test_intersection(self):
+        self.assertEqual(list(intersection(iter("abcab"), iter("bcd"))),
+                         ["b", "c", "b"])
+
+    def test_key_on_first_letter(self):
+        self.assertEqual(key_on_first_letter(iter(["Bb", "Aa", "Ba"])),
+                         {"A": ["Aa"], "B": ["Ba", "Bb"]})
+
+class TestMatchingTitles(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = TitleCache(self.directory)
+        self.api = FakeCategoryApi({"Category:Project-Class Album articles":
+                                    ["Talk:Internal %d (album)" % i
+                                     for i in range(1200)]})
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def internal_titles(self):
+        category = "Category:Project-Class Album articles"
+        return self.cache.titles("members-" + category,
+                                 lambda: self.api.members_of(category),
+                                 with_namespace=True)
+
+    def test_one_listing_for_any_number_of_matches(self):
+        album_titles = (["Talk:Album %d (album)" % i for i in range(5000)] +
+                        ["Talk:Internal %d (album)" % i for i in range(1200)])
+        result = matching_titles(album_titles, r".*\(.*album.*\)",
+                                 self.internal_titles())
+        self.assertEqual(len(result), 5000)
+        self.assertEqual(self.api.requests, 3)
+
+        # The second time around, the listing comes from the cache
+        matching_titles(album_titles, r".*\(.*album.*\)", self.internal_titles())
+        self.assertEqual(self.api.requests, 3)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+"""
+An on-disk cache for big lists of titles, like the pages transcluding a
+template or the members of a category.
+
+Each entry is a text file: a JSON header line (format version, what the entry
+is and when it was fetched) followed by one title per line. Titles are
+streamed in and out line by line, so a 200k-title list never has to sit in
+memory as one JSON object.
+"""
+import io
+import json
+import logging
+import os
+import os.path
+import re
+import time
+
+CACHE_VERSION = 1
+DEFAULT_MAX_AGE = 24 * 60 * 60
+
+class TitleCache(object):
+    """
+    A directory of cached title lists. Entries older than max_age seconds,
+    written by another version of this module, or (if force_refresh is set)
+    not yet refreshed during this run, are fetched again.
+    """
+
+    def __init__(self, directory, max_age=DEFAULT_MAX_AGE, force_refresh=False):
+        self.directory = directory
+        self.max_age = max_age
+        self.force_refresh = force_refresh
+        self.refreshed = set()
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def path(self, key):
+        """The file an entry lives in."""
+        return os.path.join(self.directory, re.sub(r"[^\w.-]", "_", key) + ".txt")
+
+    def header(self, key):
+        """The header of the entry for key, or None if there isn't one."""
+        try:
+            with io.open(self.path(key), encoding="utf-8") as entry:
+                return json.loads(entry.readline())
+        except (IOError, ValueError):
+            return None
+
+    def is_fresh(self, key):
+        """Can the entry for key be used as is?"""
+        if self.force_refresh and key not in self.refreshed:
+            return False
+        header = self.header(key)
+        return bool(header and header.get("version") == CACHE_VERSION and
+                    header.get("key") == key and
+                    time.time() - header["fetched"] < self.max_age)
+
+    def titles(self, key, fetch, with_namespace=False):
+        """
+        Yields the titles stored under key, first calling fetch() to refill
+        the entry if it isn't fresh. fetch() should return an iterable of
+        (title with namespace, title without namespace) tuples.
+        """
+        self.ensure_fresh(key, fetch)
+        column = 0 if with_namespace else 1
+        with io.open(self.path(key), encoding="utf-8") as entry:
+            entry.readline()
+            for line in entry:
+                yield line.rstrip(u"\n").split(u"\t")[column]
+
+    def ensure_fresh(self, key, fetch):
+        """Refill the entry for key by calling fetch() if it isn't fresh."""
+        if self.is_fresh(key):
+            logging.info("Using cached titles for %s" % key)
+        else:
+            self.refresh(key, fetch)
+
+    def refresh(self, key, fetch):
+        """Stream fresh titles for key into its entry."""
+        logging.info("Fetching titles for %s" % key)
+        fetched = time.time()
+        temporary_path = self.path(key) + ".tmp"
+        count = 0
+        with io.open(temporary_path, "w", encoding="utf-8") as entry:
+            header = json.dumps({"version": CACHE_VERSION, "key": key,
+                                 "fetched": fetched})
+            entry.write(u"%s\n" % header)
+            for with_namespace, without_namespace in fetch():
+                entry.write(u"%s\t%s\n" % (with_namespace, without_namespace))
+                count += 1
+
+        # Only replace the old entry once the new one is complete
+        os.rename(temporary_path, self.path(key))
+        self.refreshed.add(key)
+        logging.info("Cached %d titles for %s" % (count, key))
@@ -0,0 +1,36 @@
+"""
+Set operations over big collections of page titles.
+
+Each operation reads its inputs exactly once, so they can be generators
+straight from the API; only the second input is kept in memory (as a set).
+"""
+from itertools import groupby
+from operator import itemgetter
+import re
+
+def difference(titles, other_titles):
+    """Yields the titles that aren't in other_titles ("A minus B"), in order."""
+    excluded = set(other_titles)
+    return (title for title in titles if title not in excluded)
+
+def intersection(titles, other_titles):
+    """Yields the titles that are also in other_titles ("A and B"), in order."""
+    included = set(other_titles)
+    return (title for title in titles if title in included)
+
+def matching_titles(titles, expression, excluded_titles=()):
+    """
+    Returns a list of the titles that match the regex (from the start) and
+    aren't in excluded_titles.
+    """
+    pattern = re.compile(expression)
+    return list(difference((title for title in titles if pattern.match(title)),
+                           excluded_titles))
+
+def key_on_first_letter(the_list):
+    """
+    Splits a list (or any iterable) based on the first letter of each item.
+    http://stackoverflow.com/a/17366841/1757964
+    """
+    groupby_object = groupby(sorted(the_list), key=itemgetter(0))
+    return {key: list(value) for key, value in groupby_object}
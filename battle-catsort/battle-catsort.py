@@ -1,19 +1,18 @@
 import argparse
+import collections
 import datetime
-import pywikibot
-import re
+import io
+import multiprocessing
+import os
 import sys
 import time
 
-from clint.textui import prompt
+from catsort import BATTLE_TITLE, is_actual_battle, print_log, process
+from corpus import read_corpus, transform_page
 
-BATTLE_TITLE = re.compile(r"^Battle of (.+)")
-CATEGORY = re.compile(r"\[\[Category:(.+?)(?:\|(.+?))?\]\]")
-SUMMARY = "[[Wikipedia:Bots/Requests for approval/APersonBot 8|Bot]] {} for an article about a battle"
-BATTLE_CATEGORY_KEYWORDS = ("battle", "conflict", "military history", "war", "offensive")
+# Pywikibot (and clint) imported in main() so the corpus mode runs without them
 
-def print_log(what_to_print):
-    print(datetime.datetime.utcnow().strftime("[%Y-%m-%dT%H:%M:%SZ] ") + what_to_print)
+SUMMARY = "[[Wikipedia:Bots/Requests for approval/APersonBot 8|Bot]] {} for an article about a battle"
 
 def get_parsed_args():
     """Parse and return args."""
@@ -26,133 +25,191 @@ def get_parsed_args():
                         help="Stop making edits at this number.")
     parser.add_argument("-p", "--page", type=str,
                         help="Process ONLY this page.")
+    parser.add_argument("-j", "--jobs", type=int,
+                        default=multiprocessing.cpu_count(),
+                        help="Number of processes to run process() in.")
+    parser.add_argument("--corpus", type=str,
+                        help="Don't edit; run over the pages in this XML dump "
+                        "(.xml or .xml.bz2) or JSONL file instead.")
+    parser.add_argument("--diff", type=str, default="battle-catsort.diff",
+                        help="Where the corpus mode writes its diffs.")
+    parser.add_argument("--benchmark", action="store_true",
+                        help="Report how long each stage of the corpus mode took.")
     return parser.parse_args()
 
-def is_battle_category(category_name):
-    """Determines whether a category is a battle category based on its name."""
-    category_name = category_name.lower()
-    return any(x in category_name for x in BATTLE_CATEGORY_KEYWORDS)
-
-def is_actual_battle(page):
-    """Checks if a page is in any battle categories."""
-    return any(is_battle_category(each_category.title()) for each_category in page.categories())
-
-def add_defaultsort(wikitext, defaultsort):
-    """Removes all cat keys and adds the provided defaultsort to the wikitext."""
-    description_of_changes = ""
-
-    # First, remove cat keys
-    if re.search(r"\[\[Category:.+\|.+\]\]", wikitext):
-        description_of_changes = "removing existing category keys and "
-    wikitext = re.sub(r"\[\[Category:(.+)\|.+\]\]", r"[[Category:\1]]", wikitext)
-
-    # Then, add the defaultsort
-    description_of_changes += "adding a defaultsort"
-    category_start = wikitext.find("[[Category:")
-    wikitext = wikitext[:category_start] + "{{DEFAULTSORT:%s}}\n" % defaultsort + wikitext[category_start:]
-    return wikitext, description_of_changes
-
-# From http://stackoverflow.com/a/3844832/1757964
-def checkEqual(iterator):
+def fetch_pages(site, params):
+    """
+    Yields (title, wikitext, category names) for each page the query
+    parameters pick out, from as few requests as the API allows. Pages come
+    in batches (50 at a time for the allpages scan); a batch isn't handed
+    out until the API says it's complete, as a page's categories and text
+    can be split across several responses.
+    """
+    from pywikibot.data.api import Request
+
+    params = dict(params, action="query", formatversion=2,
+                  prop="revisions|categories", rvprop="content", rvslots="main",
+                  cllimit="max")
+    batch = {}
+    continuation = {}
+    while True:
+        response = Request(site=site, **dict(params, **continuation)).submit()
+        for page in response.get(u"query", {}).get(u"pages", []):
+            if page.get(u"missing") or page.get(u"invalid"):
+                continue
+            so_far = batch.setdefault(page[u"title"], [None, []])
+            if page.get(u"revisions"):
+                so_far[0] = page[u"revisions"][0][u"slots"][u"main"][u"content"]
+            so_far[1].extend(category[u"title"] for category in page.get(u"categories", []))
+
+        if response.get(u"batchcomplete"):
+            for title in sorted(batch):
+                wikitext, categories = batch[title]
+                if wikitext is not None:
+                    yield title, wikitext, categories
+            batch = {}
+
+        if u"continue" not in response:
+            return
+        continuation = response[u"continue"]
+
+def battle_pages(site, only_page=None):
+    """Yields (title, wikitext, category names) for the pages to look at."""
+    if only_page:
+        return fetch_pages(site, {"titles": only_page})
+    return fetch_pages(site, {"generator": "allpages", "gapprefix": "Battle of",
+                              "gapfilterredir": "nonredirects", "gaplimit": 50})
+
+def process_page(page_tuple):
+    """Runs process() in a worker; returns (title, old text, new text, changes)."""
+    page_title, wikitext = page_tuple
+    new_text, changes_made = process(page_title, wikitext)
+    return page_title, wikitext, new_text, changes_made
+
+def silence():
+    """Keeps the corpus mode's workers from logging every page."""
+    sys.stdout = open(os.devnull, "w")
+
+def run_corpus(args):
+    """Runs the transform over a local corpus, writing diffs and a summary."""
+    timings = collections.Counter()
+    changes = collections.Counter()
+    unprocessable = []
+
+    def corpus_pages():
+        pages = read_corpus(args.corpus)
+        while True:
+            start = time.time()
+            page = next(pages, None)
+            timings["read"] += time.time() - start
+            if page is None:
+                return
+            yield page
+
+    start_time = time.time()
+    pool = multiprocessing.Pool(args.jobs, initializer=silence)
+    num_pages = 0
     try:
-        iterator = iter(iterator)
-        first = next(iterator)
-        return all(first == rest for rest in iterator)
-    except StopIteration:
-        return True
-
-def make_key(page_title):
-    """Makes a battle cat key or a defaultsort key."""
-    rest_of_title = BATTLE_TITLE.search(page_title).group(1)
-    rest_of_title = re.sub("^the ", "", rest_of_title)
-    if re.search(r"^[\w\- ]+$", rest_of_title):
-        return rest_of_title
-    if re.search(r"^[\w\- ]+\((?:\w+ )?\d+\)$", rest_of_title):
-        return rest_of_title.replace("(", "").replace(")", "")
-    else:
-        print_log("WARNING: Can't process title: {}".format(page_title.encode("utf-8")))
-        return rest_of_title
-
-def process(page_object):
-    """Adds appropriate defaultsorts, based on cats."""
-    page_title = page_object.title(withNamespace=False)
-    wikitext = page_object.get()
-    global_key = make_key(page_title) # The thing that goes in a defaultsort or a cat key
-    description_of_changes = ""
-
-    if "DEFAULTSORT" in wikitext:
-        print_log("{} already has a defaultsort.".format(page_title.encode("utf-8")))
-        return
-
-    categories = [x.groups() for x in CATEGORY.finditer(wikitext)]
-    battle_categories = [x for x in categories if is_battle_category(x[0])]
-    if len(battle_categories) != len(categories):
-
-        # Some categories aren't battle categories, so a defaultsort won't work.
-        # So, we add a category key to every battle category.
-        categories_changed = 0
-        for cat_name, cat_key in battle_categories:
-            if not cat_key:
-                cat_name = unicode(cat_name)
-                wikitext = wikitext.replace(u"[[Category:{}]]".format(cat_name),
-                                            u"[[Category:{}|{}]]".format(cat_name, unicode(global_key)))
-                categories_changed += 1
-        description_of_changes = "updating {} categor{} with sort keys".format(categories_changed,
-                                                                               "y" if categories_changed == 1 else "ies")
-    else:
-
-        # Add a defaultsort
-        wikitext, description_of_changes = add_defaultsort(wikitext, global_key)
-
-    # If every single category has a key, that's pretty much equal to having a defaultsort
-    categories = [x.groups() for x in CATEGORY.finditer(wikitext)]
-    if "DEFAULTSORT" not in wikitext and categories[0][1] and checkEqual(x[1] for x in categories):
-        wikitext, description_of_changes = add_defaultsort(wikitext, global_key)
-
-    page_object.text = wikitext
-    return description_of_changes
+        with io.open(args.diff, "w", encoding="utf-8") as diff_file:
+            for page_title, kind, diff, processable, page_timings in pool.imap(
+                    transform_page, corpus_pages(), chunksize=16):
+                num_pages += 1
+                changes[kind] += 1
+                timings.update(page_timings)
+                if not processable:
+                    unprocessable.append(page_title)
+                if diff:
+                    start = time.time()
+                    diff_file.write(diff)
+                    timings["write"] += time.time() - start
+    finally:
+        pool.close()
+        pool.join()
+    elapsed = time.time() - start_time
+
+    print_log("Processed %d pages in %.1f s (%.2f pages/s); diffs are in %s." %
+              (num_pages, elapsed, num_pages / elapsed if elapsed else 0, args.diff))
+    for kind, count in changes.most_common():
+        print("%8d  %s" % (count, kind))
+    if unprocessable:
+        print("make_key can't process %d titles:" % len(unprocessable))
+        for page_title in unprocessable:
+            print("* " + page_title.encode("utf-8"))
+
+    if args.benchmark:
+        # Worker stages add up across processes, so they can exceed the wall time
+        print("Stage timings (s):")
+        for stage in ("read", "classify", "make_key", "process", "diff", "write"):
+            print("%10s %10.3f" % (stage, timings[stage]))
+        print("%10s %10.3f" % ("wall", elapsed))
 
 def main():
     print_log("Starting battle-catsort at " + datetime.datetime.utcnow().isoformat())
 
+    args = get_parsed_args()
+    if args.corpus:
+        run_corpus(args)
+        return
+
+    import pywikibot
+    from clint.textui import prompt
+
     site = pywikibot.Site("en", "wikipedia")
     site.login()
 
-    args = get_parsed_args()
     if args.count:
         num_edits = args.count
         print_log("Starting off with %d edits made." % num_edits)
     else:
         num_edits = 0
 
-    for each_page in [pywikibot.Page(site, args.page)] if args.page else site.allpages("Battle of", filterredir=False):
-        each_title = each_page.title(withNamespace=False).encode("utf-8")
-        title_match = BATTLE_TITLE.search(each_title)
-
-        if not title_match:
-            print_log("Somehow {} didn't match.".format(each_title))
-            continue
-
-        if not is_actual_battle(each_page):
-            print_log("{} isn't an actual battle.".format(each_title))
-            continue
-
-        print_log("About to process {}.".format(each_title))
-        old_text = each_page.text
-        changes_made = process(each_page)
-        if old_text == each_page.text:
-            print_log("No changes made to {}.".format(each_title))
-            continue
-
-        if not args.interactive or prompt.yn("({}) Save {}?".format(changes_made, each_title)):
-            each_page.save(summary=SUMMARY.format(changes_made))
-            num_edits += 1
-            print_log("%d edits made so far." % num_edits)
-            if args.limit and num_edits >= args.limit:
-                print_log("%d edits (limit) reached; done." % num_edits)
-                sys.exit(0)
-        elif prompt.yn("Exit?"):
-            sys.exit(0)
+    def pages_to_process():
+        for each_title, wikitext, categories in battle_pages(site, args.page):
+            if not BATTLE_TITLE.search(each_title):
+                print_log("Somehow {} didn't match.".format(each_title.encode("utf-8")))
+                continue
+
+            if not is_actual_battle(categories):
+                print_log("{} isn't an actual battle.".format(each_title.encode("utf-8")))
+                continue
+
+            print_log("About to process {}.".format(each_title.encode("utf-8")))
+            yield each_title, wikitext
+
+    # Pages are processed in the pool while the next batch is being fetched;
+    # saves (and prompts) all happen here, one at a time
+    pool = multiprocessing.Pool(args.jobs)
+    start_time = time.time()
+    num_pages = 0
+    try:
+        for each_title, old_text, new_text, changes_made in pool.imap(
+                process_page, pages_to_process(), chunksize=4):
+            num_pages += 1
+            if old_text == new_text:
+                print_log("No changes made to {}.".format(each_title.encode("utf-8")))
+                continue
+
+            each_page = pywikibot.Page(site, each_title)
+            if each_page.text != old_text:
+                print_log("{} was edited since we read it; skipping.".format(each_title.encode("utf-8")))
+                continue
+
+            if not args.interactive or prompt.yn("({}) Save {}?".format(changes_made, each_title.encode("utf-8"))):
+                each_page.text = new_text
+                each_page.save(summary=SUMMARY.format(changes_made))
+                num_edits += 1
+                print_log("%d edits made so far." % num_edits)
+                if args.limit and num_edits >= args.limit:
+                    print_log("%d edits (limit) reached; done." % num_edits)
+                    break
+            elif prompt.yn("Exit?"):
+                break
+    finally:
+        pool.terminate()
+        pool.join()
+        elapsed = time.time() - start_time
+        print_log("Processed %d pages in %.1f s (%.2f pages/s)." %
+                  (num_pages, elapsed, num_pages / elapsed if elapsed else 0))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,101 @@
+"""
+Works out sort keys for the categories on an article about a battle: a
+defaultsort when every category is (or can be) sorted the same way, and
+otherwise a key on each battle category.
+
+This doesn't need Pywikibot, so it runs in worker processes and can be
+tested on its own.
+"""
+import datetime
+import re
+
+BATTLE_TITLE = re.compile(r"^Battle of (.+)")
+CATEGORY = re.compile(r"\[\[Category:(.+?)(?:\|(.+?))?\]\]")
+BATTLE_CATEGORY_KEYWORDS = ("battle", "conflict", "military history", "war", "offensive")
+BATTLE_CATEGORY_KEYWORD = re.compile("|".join(re.escape(x) for x in BATTLE_CATEGORY_KEYWORDS))
+
+# Category name -> whether it's a battle category; there aren't many of them
+BATTLE_CATEGORY_CACHE = {}
+
+def print_log(what_to_print):
+    print(datetime.datetime.utcnow().strftime("[%Y-%m-%dT%H:%M:%SZ] ") + what_to_print)
+
+def is_battle_category(category_name):
+    """Determines whether a category is a battle category based on its name."""
+    if category_name not in BATTLE_CATEGORY_CACHE:
+        BATTLE_CATEGORY_CACHE[category_name] = bool(
+            BATTLE_CATEGORY_KEYWORD.search(category_name.lower()))
+    return BATTLE_CATEGORY_CACHE[category_name]
+
+def is_actual_battle(category_names):
+    """Checks if a page is in any battle categories, given their names."""
+    return any(is_battle_category(each_category) for each_category in category_names)
+
+def make_key_checked(page_title):
+    """
+    Makes a battle cat key or a defaultsort key. Returns it and whether the
+    title was one we know how to make a key from.
+    """
+    rest_of_title = BATTLE_TITLE.search(page_title).group(1)
+    rest_of_title = re.sub("^the ", "", rest_of_title)
+    if re.search(r"^[\w\- ]+$", rest_of_title):
+        return rest_of_title, True
+    if re.search(r"^[\w\- ]+\((?:\w+ )?\d+\)$", rest_of_title):
+        return rest_of_title.replace("(", "").replace(")", ""), True
+    return rest_of_title, False
+
+def make_key(page_title):
+    """Makes a battle cat key or a defaultsort key."""
+    key, processable = make_key_checked(page_title)
+    if not processable:
+        print_log("WARNING: Can't process title: {}".format(page_title.encode("utf-8")))
+    return key
+
+def process(page_title, wikitext):
+    """
+    Adds appropriate defaultsorts, based on cats. Returns the new wikitext
+    and a description of the changes (None if there weren't any).
+    """
+    if "DEFAULTSORT" in wikitext:
+        print_log("{} already has a defaultsort.".format(page_title.encode("utf-8")))
+        return wikitext, None
+
+    categories = list(CATEGORY.finditer(wikitext))
+    if not categories:
+        print_log("{} has no categories in its wikitext.".format(page_title.encode("utf-8")))
+        return wikitext, None
+
+    global_key = make_key(page_title) # The thing that goes in a defaultsort or a cat key
+    is_battle = [is_battle_category(category.group(1)) for category in categories]
+    had_keys = any(category.group(2) for category in categories)
+
+    if all(is_battle):
+        use_defaultsort = True
+    else:
+
+        # Some categories aren't battle categories, so a defaultsort won't work.
+        # So, we add a category key to every battle category.
+        new_keys = [category.group(2) or (global_key if battle else None)
+                    for category, battle in zip(categories, is_battle)]
+
+        # If every single category has a key, that's pretty much equal to having a defaultsort
+        use_defaultsort = new_keys[0] and all(key == new_keys[0] for key in new_keys)
+
+    if use_defaultsort:
+        def replace_category(match):
+            category = u"[[Category:{}]]".format(match.group(1))
+            if match.start() == categories[0].start():
+                return u"{{DEFAULTSORT:%s}}\n" % global_key + category
+            return category
+        description_of_changes = ("removing existing category keys and " if had_keys else "") + "adding a defaultsort"
+    else:
+        def replace_category(match):
+            if match.group(2) or not is_battle_category(match.group(1)):
+                return match.group(0)
+            return u"[[Category:{}|{}]]".format(match.group(1), global_key)
+        categories_changed = sum(1 for category, battle in zip(categories, is_battle)
+                                 if battle and not category.group(2))
+        description_of_changes = "updating {} categor{} with sort keys".format(categories_changed,
+                                                                               "y" if categories_changed == 1 else "ies")
+
+    return CATEGORY.sub(replace_category, wikitext), description_of_changes
@@ -0,0 +1,91 @@
+"""
+battle-catsort's corpus mode: reads pages from a dump or a JSONL file and
+runs the whole transform over each one, producing a diff instead of an
+edit, so a change to the transform can be checked against many pages.
+"""
+import bz2
+import collections
+import difflib
+import io
+import json
+import re
+import time
+
+try:
+    from xml.etree import cElementTree as ElementTree
+except ImportError:
+    from xml.etree import ElementTree
+
+from catsort import BATTLE_TITLE, CATEGORY, is_actual_battle, make_key_checked, process
+
+def as_text(text):
+    """ElementTree gives ASCII-only text as a byte string on Python 2."""
+    return text.decode("ascii") if isinstance(text, bytes) else text
+
+def read_corpus(path):
+    """
+    Yields (title, wikitext) for each article in an XML dump (.xml or
+    .xml.bz2) or a JSONL file (one {"title": ..., "text": ...} per line).
+    Redirects and other namespaces in the dump are left out.
+    """
+    if path.endswith(".jsonl"):
+        with io.open(path, encoding="utf-8") as corpus_file:
+            for line in corpus_file:
+                if line.strip():
+                    page = json.loads(line)
+                    yield page[u"title"], page[u"text"]
+        return
+
+    corpus_file = bz2.BZ2File(path) if path.endswith(".bz2") else open(path, "rb")
+    with corpus_file:
+        page = {}
+        for _, element in ElementTree.iterparse(corpus_file):
+            tag = element.tag.rpartition("}")[2]
+            if tag in ("title", "ns", "text"):
+                page[tag] = element.text or u""
+            elif tag == "redirect":
+                page["redirect"] = True
+            elif tag == "page":
+                if page.get("ns") == "0" and not page.get("redirect"):
+                    yield as_text(page["title"]), as_text(page.get("text", u""))
+                page = {}
+                element.clear()
+
+def transform_page(page_tuple):
+    """
+    Runs the whole transform over one corpus page, in a worker. Returns
+    (title, kind of change, unified diff, whether make_key could process the
+    title, seconds spent in each stage). The page's categories come from its
+    wikitext, not from the API, so ones added by templates aren't seen.
+    """
+    page_title, wikitext = page_tuple
+    timings = collections.Counter()
+
+    start = time.time()
+    is_battle = bool(BATTLE_TITLE.search(page_title)) and is_actual_battle(
+        match.group(1) for match in CATEGORY.finditer(wikitext))
+    timings["classify"] += time.time() - start
+    if not is_battle:
+        return page_title, "not a battle", u"", True, timings
+
+    start = time.time()
+    _, processable = make_key_checked(page_title)
+    timings["make_key"] += time.time() - start
+
+    start = time.time()
+    new_text, changes_made = process(page_title, wikitext)
+    timings["process"] += time.time() - start
+
+    if "DEFAULTSORT" in wikitext:
+        return page_title, "already has a defaultsort", u"", processable, timings
+    if new_text == wikitext:
+        return page_title, "no changes", u"", processable, timings
+
+    start = time.time()
+    # difflib can't put non-ASCII titles in the header lines, so we do
+    hunks = list(difflib.unified_diff(wikitext.splitlines(True), new_text.splitlines(True)))[2:]
+    diff = u"--- a/{0}\n+++ b/{0}\n".format(page_title) + u"".join(
+        line if line.endswith(u"\n") else line + u"\n\\ No newline at end of file\n"
+        for line in hunks)
+    timings["diff"] += time.time() - start
+    return page_title, re.sub(r"\d+ categor(y|ies)", "categories", changes_made), diff, processable, timings
@@ -0,0 +1,60 @@
+import unittest
+
+from catsort import is_battle_category, make_key_checked, process
+
+class TestCatsort(unittest.TestCase):
+    def test_battle_categories(self):
+        self.assertTrue(is_battle_category(u"Battles involving France"))
+        self.assertTrue(is_battle_category(u"Conflicts in 1066"))
+        self.assertFalse(is_battle_category(u"People from Kent"))
+
+    def test_make_key(self):
+        self.assertEqual(make_key_checked(u"Battle of Hastings"), (u"Hastings", True))
+        self.assertEqual(make_key_checked(u"Battle of the Somme"), (u"Somme", True))
+        self.assertEqual(make_key_checked(u"Battle of Adrianople (378)"), (u"Adrianople 378", True))
+        self.assertEqual(make_key_checked(u"Battle of Foo, Bar"), (u"Foo, Bar", False))
+
+    def test_keys_only_on_battle_categories(self):
+        wikitext = (u"Text.\n[[Category:Battles involving England]]\n"
+                    u"[[Category:History of Sussex]]\n[[Category:Conflicts in 1066|Sort]]")
+        new_text, changes = process(u"Battle of Hastings", wikitext)
+        self.assertEqual(new_text, u"Text.\n[[Category:Battles involving England|Hastings]]\n"
+                                   u"[[Category:History of Sussex]]\n[[Category:Conflicts in 1066|Sort]]")
+        self.assertEqual(changes, "updating 1 category with sort keys")
+
+    def test_defaultsort(self):
+        wikitext = u"Text.\n[[Category:Battles involving England]]\n[[Category:Conflicts in 1066]]"
+        new_text, changes = process(u"Battle of Hastings", wikitext)
+        self.assertEqual(new_text, u"Text.\n{{DEFAULTSORT:Hastings}}\n[[Category:Battles involving England]]\n"
+                                   u"[[Category:Conflicts in 1066]]")
+        self.assertEqual(changes, "adding a defaultsort")
+
+    def test_all_keys_equal(self):
+        # The non-battle category's key is the one the others would get
+        wikitext = u"[[Category:Battles involving England]]\n[[Category:History of Sussex|Hastings]]"
+        new_text, changes = process(u"Battle of Hastings", wikitext)
+        self.assertEqual(new_text, u"{{DEFAULTSORT:Hastings}}\n[[Category:Battles involving England]]\n"
+                                   u"[[Category:History of Sussex]]")
+        self.assertEqual(changes, "removing existing category keys and adding a defaultsort")
+
+    def test_keyed_categories_on_one_line(self):
+        wikitext = u"[[Category:Battles involving England|A]][[Category:Conflicts in 1066|B]] [[Category:Wars|C]]"
+        new_text, changes = process(u"Battle of Hastings", wikitext)
+        self.assertEqual(new_text, u"{{DEFAULTSORT:Hastings}}\n[[Category:Battles involving England]]"
+                                   u"[[Category:Conflicts in 1066]] [[Category:Wars]]")
+        self.assertEqual(changes, "removing existing category keys and adding a defaultsort")
+
+        wikitext = u"[[Category:Battles involving England|A]][[Category:People from Kent|B]][[Category:Wars]]"
+        new_text, changes = process(u"Battle of Hastings", wikitext)
+        self.assertEqual(new_text, u"[[Category:Battles involving England|A]][[Category:People from Kent|B]]"
+                                   u"[[Category:Wars|Hastings]]")
+        self.assertEqual(changes, "updating 1 category with sort keys")
+
+    def test_nothing_to_do(self):
+        self.assertEqual(process(u"Battle of Hastings", u"No categories here."),
+                         (u"No categories here.", None))
+        wikitext = u"{{DEFAULTSORT:Hastings}}\n[[Category:Wars]]"
+        self.assertEqual(process(u"Battle of Hastings", wikitext), (wikitext, None))
+
+if __name__ == "__main__":
+    unittest.main()
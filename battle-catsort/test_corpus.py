@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from corpus import read_corpus, transform_page
+
+PAGES = [
+    {"title": u"Battle of Hastings",
+     "text": u"Text.\n[[Category:Battles involving England]]\n[[Category:History of Sussex]]\n"},
+    {"title": u"Battle of Łódź",
+     "text": u"Tekst.\n[[Category:Battles involving Poland]]\n[[Category:Conflicts in 1914]]"},
+    {"title": u"Battle of Maldon",
+     "text": u"{{DEFAULTSORT:Maldon}}\n[[Category:Battles involving England]]"},
+    {"title": u"Battle of Brunanburh",
+     "text": u"[[Category:Battles involving England|Brunanburh]]\n[[Category:People from Kent]]"},
+    {"title": u"Hastings", "text": u"A town.\n[[Category:Towns in East Sussex]]"},
+]
+
+XML = u"""<mediawiki xmlns="http://www.mediawiki.org/xml/export-0.10/">
+<page><title>Battle of Hastings</title><ns>0</ns><revision><text>Text.</text></revision></page>
+<page><title>Battle of Hastings (1066)</title><ns>0</ns><redirect title="Battle of Hastings" />
+<revision><text>#REDIRECT [[Battle of Hastings]]</text></revision></page>
+<page><title>Talk:Battle of Łódź</title><ns>1</ns><revision><text>Hi.</text></revision></page>
+</mediawiki>"""
+
+class TestCorpus(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, name, text):
+        path = os.path.join(self.directory, name)
+        with io.open(path, "w", encoding="utf-8") as corpus_file:
+            corpus_file.write(text)
+        return path
+
+    def test_read_jsonl(self):
+        path = self.write("corpus.jsonl", u"".join(
+            json.dumps(page, ensure_ascii=False) + u"\n" for page in PAGES))
+        self.assertEqual(list(read_corpus(path)),
+                         [(page["title"], page["text"]) for page in PAGES])
+
+    def test_read_xml(self):
+        path = self.write("corpus.xml", XML)
+        self.assertEqual(list(read_corpus(path)), [(u"Battle of Hastings", u"Text.")])
+
+    def test_changes(self):
+        results = [transform_page((page["title"], page["text"])) for page in PAGES]
+        self.assertEqual([kind for _, kind, _, _, _ in results],
+                         ["updating categories with sort keys", "adding a defaultsort",
+                          "already has a defaultsort", "no changes", "not a battle"])
+        self.assertEqual([diff for _, kind, diff, _, _ in results if "updating" not in kind
+                          and "adding" not in kind], [u"", u"", u""])
+
+    def test_diff(self):
+        _, _, diff, processable, _ = transform_page((PAGES[0]["title"], PAGES[0]["text"]))
+        self.assertTrue(processable)
+        self.assertEqual(diff, u"""--- a/Battle of Hastings
++++ b/Battle of Hastings
+@@ -1,3 +1,3 @@
+ Text.
+-[[Category:Battles involving England]]
++[[Category:Battles involving England|Hastings]]
+ [[Category:History of Sussex]]
+""")
+
+    def test_diff_non_ascii_title(self):
+        # The header is written by hand, and a last line without a newline is marked
+        _, _, diff, _, _ = transform_page((PAGES[1]["title"], PAGES[1]["text"]))
+        self.assertEqual(diff, u"""--- a/Battle of Łódź
++++ b/Battle of Łódź
+@@ -1,3 +1,4 @@
+ Tekst.
++{{DEFAULTSORT:Łódź}}
+ [[Category:Battles involving Poland]]
+ [[Category:Conflicts in 1914]]
+\\ No newline at end of file
+""")
+
+if __name__ == "__main__":
+    unittest.main()
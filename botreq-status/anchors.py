@@ -0,0 +1,86 @@
+"""
+Works out the titles and ids (anchors) MediaWiki gives the sections of a
+page from its wikitext, so the rendered HTML doesn't have to be fetched.
+
+Ids are made the way MediaWiki does with $wgFragmentMode = ["html5"]: the
+heading's text with whitespace turned into underscores, and _2, _3...
+added to repeats, counting headings at every level.
+"""
+import bisect
+import html
+import re
+
+HEADING = re.compile(r"^(=+)(.+?)(=+)[ \t]*$", flags=re.M)
+COMMENT = re.compile(r"<!--.*?(?:-->|\Z)", flags=re.S)
+TEMPLATE = re.compile(r"\{\{[^{}]*\}\}")
+LINK = re.compile(r"\[\[:?([^\[\]|]*)(?:\|([^\[\]]*))?\]\]")
+EXTERNAL_LINK = re.compile(r"\[(?:https?:)?//[^\s\]]+(?: ([^\]]*))?\]")
+BOLD_ITALIC = re.compile(r"'{2,}")
+TAG = re.compile(r"</?[A-Za-z][^<>]*>")
+WHITESPACE = re.compile(r"[\s_]+")
+
+# Characters that can't go in a wikilink's fragment as they are
+LINK_ESCAPES = {ord(c): "%{:02X}".format(ord(c)) for c in "[]{}|"}
+
+def headings(page_content):
+    """
+    Yields (level, title wikitext, match) for each heading on the page,
+    leaving out any inside comments.
+    """
+    comment_spans = [(m.start(), m.end()) for m in COMMENT.finditer(page_content)]
+    comment_starts = [start for start, _ in comment_spans]
+    for match in HEADING.finditer(page_content):
+        i = bisect.bisect_right(comment_starts, match.start()) - 1
+        if i >= 0 and match.start() < comment_spans[i][1]:
+            continue
+
+        # Unbalanced equals signs end up in the title
+        opening, title, closing = match.groups()
+        level = min(len(opening), len(closing), 6)
+        title = "=" * (len(opening) - level) + title + "=" * (len(closing) - level)
+        yield level, title, match
+
+def heading_text(title):
+    """The text a heading's title wikitext is displayed as (minus templates)."""
+    text = COMMENT.sub("", title)
+    while True:
+        text, count = TEMPLATE.subn("", text)
+        if not count:
+            break
+    text = LINK.sub(lambda m: m.group(2) if m.group(2) is not None else m.group(1), text)
+    text = EXTERNAL_LINK.sub(lambda m: m.group(1) or "", text)
+    text = BOLD_ITALIC.sub("", text)
+    text = TAG.sub("", text)
+    text = html.unescape(text)
+    return WHITESPACE.sub(" ", text).strip()
+
+def anchor_ids(texts):
+    """
+    Returns the id for each heading text, in order. Repeats (ignoring case)
+    get _2, _3... on the end, like MediaWiki does.
+    """
+    ids, seen = [], set()
+    for text in texts:
+        anchor = text.replace(" ", "_")
+        key = anchor.lower()
+        if key in seen:
+            suffix = 2
+            while "{}_{}".format(key, suffix) in seen:
+                suffix += 1
+            anchor = "{}_{}".format(anchor, suffix)
+            key = anchor.lower()
+        seen.add(key)
+        ids.append(anchor)
+    return ids
+
+def link_anchor(anchor):
+    """Escapes an id for use after the # in a wikilink."""
+    return anchor.translate(LINK_ESCAPES)
+
+def get_section_titles_and_ids(page_content):
+    """Returns a dict with the title and id of each level-2 section, in order."""
+    page_headings = list(headings(page_content))
+    texts = [heading_text(title) for _, title, _ in page_headings]
+    return [{"title": text, "id": anchor}
+            for (level, _, _), text, anchor in zip(page_headings, texts, anchor_ids(texts))
+            if level == 2]
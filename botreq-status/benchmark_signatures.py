@@ -0,0 +1,86 @@
+"""
+Times the signature scanner over a saved copy of Wikipedia:Bot requests,
+against the backward search that botreq-status used before signatures.py,
+and checks that the two agree.
+
+The saved copy is a file holding the page's wikitext, e.g. from
+https://en.wikipedia.org/wiki/Wikipedia:Bot_requests?action=raw
+"""
+import argparse
+import datetime
+import itertools
+import time
+
+import mwparserfromhell
+
+from signatures import (SIGNATURE_TIME_FORMAT, TIMESTAMP, USER,
+                        scan_signatures, split_sections)
+
+def legacy_signatures(section):
+    """The old scan of a parsed section, kept for comparison."""
+    signatures = []
+    for index, each_node in enumerate(section.nodes):
+        if type(each_node) == mwparserfromhell.nodes.text.Text and "(UTC)" in each_node:
+
+            # Get the last timestamp-looking thing (trick from http://stackoverflow.com/a/2988680/1757964)
+            each_node = str(each_node)
+            for timestamp_match in TIMESTAMP.finditer(each_node): pass
+            try:
+                timestamp = datetime.datetime.strptime(timestamp_match.group(0), SIGNATURE_TIME_FORMAT)
+            except ValueError:
+                timestamp = "{{unknown}}"
+
+            # Use the last user talk page link before the timestamp
+            for user_index in itertools.count(index - 1, -1):
+                user = USER.search(str(section.get(user_index)))
+                if user:
+                    user = user.group(1)
+                    break
+
+            signatures.append((user, timestamp))
+
+    return [(x.partition('#')[0], y) for x, y in signatures]
+
+def legacy_or_error(section):
+    """The old scan's result, or the exception it died with."""
+    try:
+        return legacy_signatures(section)
+    except Exception as error:
+        return repr(error)
+
+def timed(label, function):
+    """Prints how long one way of scanning the page took; returns its result."""
+    start = time.time()
+    result = function()
+    print("%-24s %8.3f s" % (label, time.time() - start))
+    return result
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("page", help="File with the wikitext of WP:Bot requests.")
+    parser.add_argument("-n", "--repeat", type=int, default=1,
+                        help="Scan every section this many times.")
+    args = parser.parse_args()
+
+    with open(args.page, encoding="utf-8") as page_file:
+        page_content = page_file.read()
+    sections = timed("split + parse", lambda: [
+        mwparserfromhell.parse(section) for section in split_sections(page_content)])
+    print("{} sections, {} signatures-ish.".format(
+        len(sections), page_content.count("(UTC)")))
+
+    new = timed("signatures.py", lambda: [
+        list(scan_signatures(section)) for _ in range(args.repeat)
+        for section in sections])[:len(sections)]
+    old = timed("backward search", lambda: [
+        legacy_or_error(section) for _ in range(args.repeat)
+        for section in sections])[:len(sections)]
+
+    mismatches = [number for number, (x, y) in enumerate(zip(old, new), 1) if x != y]
+    print("{} of {} sections differ from the old scan.".format(
+        len(mismatches), len(sections)))
+    for number in mismatches:
+        print("* section {}: {!r} != {!r}".format(number, old[number - 1], new[number - 1]))
+
+if __name__ == "__main__":
+    main()
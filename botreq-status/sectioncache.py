@@ -0,0 +1,52 @@
+"""
+A store, kept between runs, of the last revision of WP:Bot requests that
+was reported on and of what was found in each of its sections, keyed on a
+hash of the section's text so unchanged sections don't get scanned again.
+"""
+import datetime
+import hashlib
+import json
+
+import mwparserfromhell
+
+from signatures import SIGNATURE_TIME_FORMAT, parse_timestamp, scan_signatures
+
+class SectionCache:
+    """Replies and signatures for each section we've seen, by text hash."""
+
+    def __init__(self, path):
+        self.path = path
+        try:
+            with open(path) as cache_file:
+                data = json.load(cache_file)
+        except (IOError, ValueError):
+            data = {}
+
+        self.revid = data.get("revid")
+
+        # text hash -> {"replies": number, "signatures": [[user, time]]}
+        self.sections = data.get("sections", {})
+        self.used = set()
+
+    def save(self, revid):
+        """Remembers revid and the sections scanned since this was loaded."""
+        self.revid = revid
+        self.sections = {key: self.sections[key] for key in self.used}
+        with open(self.path, "w") as cache_file:
+            json.dump({"revid": self.revid, "sections": self.sections}, cache_file)
+
+    def scan(self, section_wikitext):
+        """Returns the section's (replies, signatures), scanning it if it's new."""
+        key = hashlib.sha1(section_wikitext.encode("utf-8")).hexdigest()
+        self.used.add(key)
+        if key not in self.sections:
+            section = mwparserfromhell.parse(section_wikitext)
+            signatures = [[user, timestamp.strftime(SIGNATURE_TIME_FORMAT)
+                           if isinstance(timestamp, datetime.datetime) else timestamp]
+                          for user, timestamp in scan_signatures(section)]
+            self.sections[key] = {"replies": section.count(u"(UTC)") - 1,
+                                  "signatures": signatures}
+
+        found = self.sections[key]
+        return found["replies"], [(user, parse_timestamp(timestamp))
+                                  for user, timestamp in found["signatures"]]
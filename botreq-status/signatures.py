@@ -0,0 +1,58 @@
+"""
+Splits WP:Bot requests into its level-2 sections and finds the signatures
+in each one, in a single pass over the section's parsed nodes.
+"""
+import datetime
+import re
+
+import mwparserfromhell
+
+from anchors import headings
+
+USER = re.compile(r"\[\[User.*?:(.*?)(?:\||(?:\]\]))")
+TIMESTAMP = re.compile(r"\d{2}:\d{2}, \d{1,2} [A-Za-z]* \d{4}")
+
+SIGNATURE_TIME_FORMAT = "%H:%M, %d %B %Y"
+
+def split_sections(page_content):
+    """Returns the content of each level-2 section on the page, stripped."""
+    section_headers = [match for level, _, match in headings(page_content)
+                       if level == 2]
+
+    sections = []
+    for i, section_header_match in enumerate(section_headers):
+        if i + 1 < len(section_headers):
+            this_section_end = section_headers[i + 1].start(0) - 1
+        else:
+            this_section_end = len(page_content)
+        this_section_start = section_header_match.end(0)
+        sections.append(page_content[this_section_start:this_section_end].strip())
+    return sections
+
+def parse_timestamp(text):
+    """
+    Returns the last timestamp in text as a datetime, or "{{unknown}}" if
+    there isn't one that makes sense.
+    """
+    timestamps = TIMESTAMP.findall(text)
+    try:
+        return datetime.datetime.strptime(timestamps[-1], SIGNATURE_TIME_FORMAT)
+    except (IndexError, ValueError):
+        return "{{unknown}}"
+
+def scan_signatures(section):
+    """
+    Yields a (user, timestamp) pair, in order, for each text node in the
+    parsed section that has "(UTC)" in it. The user is the one from the
+    last user link before it (in any node, subsection headers included),
+    minus any anchor; text nodes with no user link before them are skipped.
+    """
+    last_user = None
+    for node in section.nodes:
+        text = str(node)
+        if isinstance(node, mwparserfromhell.nodes.Text):
+            if "(UTC)" in text and last_user is not None:
+                yield last_user.partition("#")[0], parse_timestamp(text)
+        user = USER.search(text)
+        if user:
+            last_user = user.group(1)
@@ -0,0 +1,42 @@
+import unittest
+
+from anchors import (anchor_ids, get_section_titles_and_ids, heading_text,
+                     link_anchor)
+
+PAGE = """{{header}}
+== Bot to fix [[Foo|foos]] ==
+text
+=== Details ===
+<!--
+== Commented out ==
+-->
+== {{tl|cite web}} ''cleanup'' &amp; <span id="x">more</span> ==
+=== Bot to fix foos ===
+== Bot to fix  foos ==
+== Unbalanced ===
+"""
+
+class TestAnchors(unittest.TestCase):
+    def test_heading_text(self):
+        self.assertEqual(heading_text(" [[:Category:Foo]] and [[Bar|baz]] "),
+                         "Category:Foo and baz")
+        self.assertEqual(heading_text("'''Bold''' {{a|{{b}}}}<!-- c --> [https://example.org site]"),
+                         "Bold site")
+        self.assertEqual(heading_text("a_b &lt;3 &#91;x&#93;"), "a b <3 [x]")
+
+    def test_anchor_ids(self):
+        self.assertEqual(anchor_ids(["A b", "a B", "A_b_2", "A b"]),
+                         ["A_b", "a_B_2", "A_b_2_2", "A_b_3"])
+
+    def test_link_anchor(self):
+        self.assertEqual(link_anchor("[x]_{y}|z"), "%5Bx%5D_%7By%7D%7Cz")
+
+    def test_sections(self):
+        self.assertEqual(get_section_titles_and_ids(PAGE), [
+            {"title": "Bot to fix foos", "id": "Bot_to_fix_foos"},
+            {"title": "cleanup & more", "id": "cleanup_&_more"},
+            {"title": "Bot to fix foos", "id": "Bot_to_fix_foos_3"},
+            {"title": "Unbalanced =", "id": "Unbalanced_="}])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+
+try:
+    import mwparserfromhell
+except ImportError:
+    mwparserfromhell = None
+
+if mwparserfromhell:
+    from sectioncache import SectionCache
+
+SECTION = """Please. [[User:Alice|Alice]] 12:00, 1 January 2020 (UTC)
+:Odd date [[User:Bob]] 12:00, 1 Janvember 2020 (UTC)"""
+
+@unittest.skipUnless(mwparserfromhell, "mwparserfromhell is needed for this test")
+class TestSectionCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "section-cache.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_round_trip(self):
+        cache = SectionCache(self.path)
+        self.assertIsNone(cache.revid)
+        found = cache.scan(SECTION)
+        self.assertEqual(found, (1, [("Alice", datetime.datetime(2020, 1, 1, 12, 0)),
+                                     ("Bob", "{{unknown}}")]))
+        cache.save(123)
+
+        cache = SectionCache(self.path)
+        self.assertEqual(cache.revid, 123)
+        self.assertEqual(len(cache.sections), 1)
+        self.assertEqual(cache.scan(SECTION), found)
+
+    def test_forgets_unused_sections(self):
+        cache = SectionCache(self.path)
+        cache.scan(SECTION)
+        cache.save(1)
+
+        cache = SectionCache(self.path)
+        cache.scan("Something else")
+        cache.save(2)
+        self.assertEqual(len(SectionCache(self.path).sections), 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import datetime
+import unittest
+
+try:
+    import mwparserfromhell
+except ImportError:
+    mwparserfromhell = None
+
+if mwparserfromhell:
+    from benchmark_signatures import legacy_signatures
+    from signatures import scan_signatures, split_sections
+
+PAGE = """{{header}}
+== First request ==
+Please make a bot. [[User:Alice|Alice]] ([[User talk:Alice|talk]]) 12:00, 1 January 2020 (UTC)
+:Sure. <small>[[User:Bob#top|Bob]]</small> 13:30, 2 January 2020 (UTC)
+=== Subsection by [[User:Carol]] ===
+::Details, no link 14:00, 3 Janvember 2020 (UTC)
+::{{ping|Alice}} Done? [[User:Dave (bot op)|Dave]] 15:00, 4 January 2020 (UTC) [[User:Eve|Eve]] 16:00, 5 January 2020 (UTC)
+
+== Second request ==
+Text with a [[User talk:Frank|link]] in it, unsigned
+
+== Third request ==
+[[User:Grace]] 01:02, 3 March 2021 (UTC)
+"""
+
+def at(text):
+    return datetime.datetime.strptime(text, "%H:%M, %d %B %Y")
+
+@unittest.skipUnless(mwparserfromhell, "mwparserfromhell is needed for this test")
+class TestSignatures(unittest.TestCase):
+    def scan(self, section):
+        return list(scan_signatures(mwparserfromhell.parse(section)))
+
+    def test_split_sections(self):
+        sections = split_sections(PAGE)
+        self.assertEqual(len(sections), 3)
+        self.assertTrue(sections[0].startswith("Please make a bot."))
+        self.assertIn("=== Subsection", sections[0])
+        self.assertEqual(sections[2], "[[User:Grace]] 01:02, 3 March 2021 (UTC)")
+
+    def test_signatures(self):
+        sections = split_sections(PAGE)
+        self.assertEqual(self.scan(sections[0]), [
+            ("Alice", at("12:00, 1 January 2020")),
+            ("Bob", at("13:30, 2 January 2020")),
+            ("Carol", "{{unknown}}"),
+            ("Dave (bot op)", at("15:00, 4 January 2020")),
+            ("Eve", at("16:00, 5 January 2020"))])
+        self.assertEqual(self.scan(sections[1]), [])
+        self.assertEqual(self.scan(sections[2]), [("Grace", at("01:02, 3 March 2021"))])
+
+    def test_no_user_before(self):
+        # The old scan wrapped around to the end of the section here
+        self.assertEqual(self.scan("Unsigned 12:00, 1 January 2020 (UTC) [[User:Late]]"), [])
+
+    def test_same_as_backward_search(self):
+        for section in split_sections(PAGE):
+            section = mwparserfromhell.parse(section)
+            self.assertEqual(list(scan_signatures(section)), legacy_signatures(section))
+
+if __name__ == "__main__":
+    unittest.main()
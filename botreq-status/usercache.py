@@ -0,0 +1,98 @@
+"""
+A cache, kept between runs, of what we know about the users who sign
+WP:Bot requests: where their (possibly renamed) user pages redirect, and who
+the bot operators are.
+
+The methods that ask the wiki take an api function, which sends a dict of
+query parameters and returns the parsed reply, so tests can hand them a fake.
+"""
+import json
+import os
+import time
+
+DEFAULT_TTL = 7 * 24 * 60 * 60
+
+# User pages per redirect lookup; 50 is the most without apihighlimits
+MAX_TITLES = 50
+
+def query(api, params):
+    """Yields every response to a query, following continuations."""
+    continuation = {}
+    while True:
+        request = dict(params, action="query", formatversion=2)
+        request.update(continuation)
+        response = api(request)
+        yield response
+        if "continue" not in response:
+            return
+        continuation = response["continue"]
+
+class UserCache:
+    """Canonical usernames and bot operators, each remembered for ttl seconds."""
+
+    def __init__(self, path, ttl=DEFAULT_TTL):
+        self.path = path
+        self.ttl = ttl
+        try:
+            with open(path) as cache_file:
+                data = json.load(cache_file)
+        except (IOError, ValueError):
+            data = {}
+
+        # username -> [canonical username, when we found out]
+        self.canonical = data.get("canonical", {})
+
+        # {"members": [usernames], "fetched": when we found out}
+        self.botop_data = data.get("botops", {})
+
+    def save(self):
+        with open(self.path, "w") as cache_file:
+            json.dump({"canonical": self.canonical,
+                       "botops": self.botop_data}, cache_file)
+
+    def is_fresh(self, when):
+        return time.time() - when < self.ttl
+
+    def resolve(self, api, usernames):
+        """
+        Returns a dict from each username to the name of the user their
+        user page redirects to (for renamed users), or to the normalized
+        username if it isn't a redirect. Only users we haven't looked up
+        recently are asked about, MAX_TITLES per request.
+        """
+        unknown = sorted(set(username for username in usernames
+                             if username not in self.canonical or
+                             not self.is_fresh(self.canonical[username][1])))
+        for start in range(0, len(unknown), MAX_TITLES):
+            batch = unknown[start:start + MAX_TITLES]
+            targets = {}
+            for response in query(api, {"titles": "|".join("User:" + x for x in batch),
+                                        "redirects": 1, "prop": "info"}):
+                for hop in (response.get("query", {}).get("normalized", []) +
+                            response.get("query", {}).get("redirects", [])):
+                    targets[hop["from"]] = hop["to"]
+
+            now = time.time()
+            for username in batch:
+                title, seen = "User:" + username, set()
+                while title in targets and title not in seen:
+                    seen.add(title)
+                    title = targets[title]
+                self.canonical[username] = [title.partition(":")[2], now]
+
+        return {username: self.canonical[username][0] for username in usernames}
+
+    def botops(self, api, category):
+        """
+        Returns the set of usernames whose user pages are in the category,
+        listing its members again if we haven't done so recently.
+        """
+        if not self.is_fresh(self.botop_data.get("fetched", 0)):
+            members = []
+            for response in query(api, {"list": "categorymembers",
+                                        "cmtitle": category, "cmnamespace": 2,
+                                        "cmlimit": "max"}):
+                members.extend(member["title"].partition(":")[2] for member in
+                               response.get("query", {}).get("categorymembers", []))
+            self.botop_data = {"members": members, "fetched": time.time()}
+        return set(self.botop_data["members"])
@@ -0,0 +1,123 @@
+"""
+Helpers for asking the API about many pages per request instead of making
+one round trip per page.
+
+Pywikibot is deliberately not imported here, so this can be tested against a
+fake API: anything callable that takes a dict of request parameters and
+returns the decoded JSON response will do.
+"""
+import collections
+
+# Clients may normally put 50 titles into one query (bots get 500), but
+# revision content is only returned for 50 pages per request either way.
+MAX_TITLES = 50
+
+TALK_PAGE_PARAMS = {"prop": "info|revisions", "rvprop": "content",
+                    "rvslots": "main"}
+
+TalkPage = collections.namedtuple("TalkPage", ["exists", "redirect", "text"])
+
+class CountingApi(object):
+    """Wraps an API callable and counts the requests sent through it."""
+
+    def __init__(self, api):
+        self.api = api
+        self.requests = 0
+
+    def __call__(self, params):
+        self.requests += 1
+        return self.api(params)
+
+def merge_page(page, more):
+    """Merges a continued page object from a response into an earlier one."""
+    for key, value in more.items():
+        if isinstance(value, list) and isinstance(page.get(key), list):
+            page[key].extend(value)
+        else:
+            page[key] = value
+
+def query_titles(api, titles, params, batch_size=MAX_TITLES):
+    """
+    Runs an action=query request over the given titles, batch_size titles at
+    a time, and yields (title, page) for every title asked about. The page is
+    the formatversion=2 page object (with continuations merged in), or None
+    if the API didn't mention the title at all.
+    """
+    titles = list(titles)
+    for start in range(0, len(titles), batch_size):
+        batch = titles[start:start + batch_size]
+        pages = {}
+        normalized = {}
+        continuation = {}
+        while True:
+            request = dict(params, action="query", formatversion=2,
+                           titles="|".join(batch))
+            request.update(continuation)
+            response = api(request)
+            query = response.get("query", {})
+            for each in query.get("normalized", []):
+                normalized[each["from"]] = each["to"]
+            for page in query.get("pages", []):
+                merge_page(pages.setdefault(page["title"], {}), page)
+            if "continue" not in response:
+                break
+            continuation = response["continue"]
+
+        for title in batch:
+            yield (title, pages.get(normalized.get(title, title)))
+
+def category_revisions(api, category):
+    """
+    Returns a dict from the title of every page in the category to its
+    latest revision ID, without downloading any page content.
+    """
+    revisions = {}
+    continuation = {}
+    while True:
+        request = dict(action="query", formatversion=2,
+                       generator="categorymembers", gcmtitle=category,
+                       gcmlimit="max", prop="info")
+        request.update(continuation)
+        response = api(request)
+        for page in response.get("query", {}).get("pages", []):
+            revisions[page["title"]] = page["lastrevid"]
+        if "continue" not in response:
+            break
+        continuation = response["continue"]
+    return revisions
+
+def page_text(page):
+    """Gets the current wikitext out of a page object, or None."""
+    revisions = page.get("revisions") or [{}]
+    main_slot = revisions[0].get("slots", {}).get("main", {})
+    return main_slot.get("content", revisions[0].get("content"))
+
+def latest_texts(api, titles):
+    """
+    Yields (text, title, revid) for the latest revision of each of the
+    given pages, skipping pages that are missing or came back without any
+    content (e.g. revision-deleted, or deleted since they were listed).
+    """
+    params = {"prop": "revisions", "rvprop": "ids|content", "rvslots": "main"}
+    for title, page in query_titles(api, titles, params):
+        text = page_text(page) if page else None
+        if text is not None:
+            yield (text, title, page["revisions"][0]["revid"])
+
+def resolve_talk_pages(api, usernames, batch_size=MAX_TITLES):
+    """
+    Looks up the user talk pages of all of the given users at once. Returns a
+    dict from username to a TalkPage saying whether the page exists, whether
+    it's a redirect, and what its current wikitext is.
+    """
+    usernames_by_title = {"User talk:" + name: name for name in usernames}
+    result = {}
+    for title, page in query_titles(api, usernames_by_title, TALK_PAGE_PARAMS,
+                                    batch_size):
+        username = usernames_by_title[title]
+        if not page or page.get("missing") or page.get("invalid"):
+            result[username] = TalkPage(False, False, None)
+        else:
+            result[username] = TalkPage(True, bool(page.get("redirect")),
+                                        page_text(page))
+    return result
@@ -0,0 +1,135 @@
+"""
+Times the nomination parser over a corpus of saved nomination pages, against
+the old BeautifulSoup-based parser and across a process pool.
+
+The corpus is a directory of .txt files, each holding the wikitext of one
+page from Category:Pending DYK nominations; the file name (minus .txt) is
+used as the subpage name. Needs beautifulsoup4 and lxml for the comparison.
+"""
+import argparse
+import contextlib
+import multiprocessing
+import os
+import os.path
+import re
+import sys
+import time
+
+import nominations
+
+NOMINATION_PREFIX = "Template:Did you know nominations/"
+
+try:
+    TEXT_TYPE = unicode
+except NameError:
+    TEXT_TYPE = str
+
+def legacy_who_to_nominate(wikitext, title):
+    """The parser dyknotifier used before nominations.py, kept for comparison."""
+    from bs4 import BeautifulSoup
+
+    if "#REDIRECT" in wikitext:
+        return {}
+
+    if "<small>" not in wikitext:
+        return {}
+
+    soup = BeautifulSoup(wikitext, "lxml")
+    small_tags = [TEXT_TYPE(x.string) for x in soup.find_all("small")]
+    nom_lines = [tag for tag in small_tags if u"Nominated by" in tag]
+    if len(nom_lines) != 1:
+        return {}
+
+    usernames = legacy_usernames_from_text_with_sigs(nom_lines[0])
+    if len(usernames) == 0:
+        return {}
+
+    nominator = usernames[-1]
+    while nominator in usernames:
+        usernames.remove(nominator)
+
+    discussion_text = wikitext[wikitext.find("</small>") + len("</small>"):]
+    discussion = legacy_usernames_from_text_with_sigs(discussion_text)
+    usernames = [user for user in usernames if user not in discussion]
+
+    return {username: title for username in usernames}
+
+def legacy_usernames_from_text_with_sigs(wikitext):
+    "Returns the users whose talk pages are linked to in the wikitext."
+    return [wikitext[m.end():m.end()+wikitext[m.end():].find("|")]\
+            for m in re.finditer(r"User talk:", wikitext)]
+
+def load_corpus(directory):
+    """Returns a list of (wikitext, title) tuples from the corpus directory."""
+    corpus = []
+    for filename in sorted(os.listdir(directory)):
+        if not filename.endswith(".txt"):
+            continue
+        with open(os.path.join(directory, filename), "rb") as nom_file:
+            wikitext = nom_file.read().decode("utf-8")
+        corpus.append((wikitext, NOMINATION_PREFIX + filename[:-4]))
+    return corpus
+
+@contextlib.contextmanager
+def quiet():
+    """Silence the parsers' diagnostic printing while timing them."""
+    stdout = sys.stdout
+    with open(os.devnull, "w") as devnull:
+        sys.stdout = devnull
+        try:
+            yield
+        finally:
+            sys.stdout = stdout
+
+def timed(label, function):
+    """
+    Calls function inside quiet(), prints the time it took next to label,
+    and returns its result.
+    """
+    start = time.time()
+    with quiet():
+        result = function()
+    print("%-28s %8.3f s" % (label, time.time() - start))
+    return result
+
+def main():
+    "The main function."
+    parser = argparse.ArgumentParser()
+    parser.add_argument("corpus", help="Directory of saved nomination pages.")
+    parser.add_argument("-j", "--jobs", type=int,
+                        default=multiprocessing.cpu_count(),
+                        help="Number of processes for the pooled run.")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    print("Loaded %d nominations." % len(corpus))
+
+    new = timed("nominations.py", lambda: [
+        nominations.get_who_to_nominate(*nom) for nom in corpus])
+
+    # Start the workers while quiet, so they stay that way
+    with quiet():
+        pool = multiprocessing.Pool(args.jobs)
+    try:
+        timed("nominations.py, %d procs" % args.jobs, lambda: pool.map(
+            nominations.parse_nomination, corpus, chunksize=8))
+    finally:
+        pool.close()
+        pool.join()
+
+    try:
+        import bs4 # pylint: disable=unused-variable
+    except ImportError:
+        print("beautifulsoup4 isn't installed; skipping the old parser.")
+        return
+
+    old = timed("BeautifulSoup", lambda: [
+        legacy_who_to_nominate(*nom) for nom in corpus])
+    mismatches = [nom[1] for nom, x, y in zip(corpus, old, new) if x != y]
+    print("%d of %d results differ from the old parser." %
+          (len(mismatches), len(corpus)))
+    for title in mismatches:
+        print("* " + title)
+
+if __name__ == "__main__":
+    main()
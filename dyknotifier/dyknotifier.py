@@ -4,25 +4,25 @@ expand are nominated for DYK by someone else.
 """
 import argparse
 import ConfigParser
-from datetime import datetime, timedelta
-import functools
-import json
-import operator
+from datetime import datetime
+import multiprocessing
 import os.path
 # pylint: disable=import-error
 import pywikibot
 import pywikibot.pagegenerators as pagegenerators
-import re
+from pywikibot.data.api import Request
 import sys
 import time
 import traceback
 
-from bs4 import BeautifulSoup
 from clint.textui import prompt
 
+import batchquery
+import dykstore
+import nominations
+import notifyqueue
+
 CONFIG = None
-BAD_TEXT = re.compile(r"(Self(-|\s)nominated|Category:((f|F)ailed|(p|P)assed) DYK)",
-                      re.I)
 
 def main():
     "The main function."
@@ -30,11 +30,18 @@ def main():
     read_config()
     verify_data_present()
     args = parse_args()
+
+    # notify_people does its own edit rate limiting
+    pywikibot.config.maxlag = args.maxlag
+    pywikibot.config.put_throttle = 0
     wiki = pywikibot.Site("en", "wikipedia")
     wiki.login()
-    people_to_notify = get_people_to_notify(wiki)
-    people_to_notify = prune_list_of_people(people_to_notify)
-    notify_people(people_to_notify, args, wiki)
+    database = notified_database()
+    store = dykstore.NotifiedStore(database)
+    cache = dykstore.NominationCache(database) if args.incremental else None
+    people_to_notify = get_people_to_notify(wiki, args.jobs, cache)
+    people_to_notify = prune_list_of_people(people_to_notify, wiki, store)
+    notify_people(people_to_notify, args, wiki, store)
 
 def read_config():
     """Read the config file."""
@@ -42,12 +49,35 @@ def read_config():
     CONFIG = ConfigParser.RawConfigParser()
     CONFIG.read("/data/project/apersonbot/bot/dyknotifier/config.txt")
 
+def notified_database():
+    """
+    The path of the already-notified database: ALREADY_NOTIFIED_DB if the
+    config has it, or else ALREADY_NOTIFIED_FILE with a .sqlite extension.
+    """
+    if CONFIG.has_option("dyknotifier", "ALREADY_NOTIFIED_DB"):
+        return CONFIG.get("dyknotifier", "ALREADY_NOTIFIED_DB")
+    json_file = CONFIG.get("dyknotifier", "ALREADY_NOTIFIED_FILE")
+    return os.path.splitext(json_file)[0] + ".sqlite"
+
 def verify_data_present():
-    """Check that the already-notified database is there."""
-    if not os.path.isfile(CONFIG.get("dyknotifier", "ALREADY_NOTIFIED_FILE")):
-        print("Couldn't locate %s" % CONFIG.get("dyknotifier", "ALREADY_NOTIFIED_FILE"))
+    """
+    Check that the already-notified database is there, importing it from
+    the old JSON file if this is the first run since the switch.
+    """
+    database = notified_database()
+    if os.path.isfile(database):
+        return
+
+    json_file = CONFIG.get("dyknotifier", "ALREADY_NOTIFIED_FILE")
+    if not os.path.isfile(json_file):
+        print("Couldn't locate %s or %s" % (database, json_file))
         sys.exit(1)
 
+    store = dykstore.NotifiedStore(database)
+    print("Imported %d notifications from %s." %
+          (store.import_json(json_file), json_file))
+    store.close()
+
 def parse_args():
     "Parse the arguments."
     parser = argparse.ArgumentParser(prog="DYKNotifier",
@@ -57,37 +87,99 @@ def parse_args():
                         help="Confirm before each edit.")
     parser.add_argument("-c", "--count", type=int,
                         help="Notify at most n people.")
+    parser.add_argument("-w", "--workers", type=int, default=2,
+                        help="Save this many talk pages at once.")
+    parser.add_argument("-r", "--edits-per-minute", type=float, default=6,
+                        help="Don't edit faster than this.")
+    parser.add_argument("--maxlag", type=int, default=5,
+                        help="The maxlag to send with every request.")
+    parser.add_argument("-j", "--jobs", type=int,
+                        default=multiprocessing.cpu_count(),
+                        help="Parse nominations in this many processes.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only download nominations changed since the "
+                        "last incremental run.")
     return parser.parse_args()
 
-def get_people_to_notify(wiki):
+def make_api(wiki):
+    "Returns a function that submits a dict of API parameters to the wiki."
+    def submit(params):
+        "Submit one API request."
+        return Request(site=wiki, **params).submit()
+    return submit
+
+def get_people_to_notify(wiki, jobs=1, cache=None):
     """
     Returns a dict of user talkpages to notify about their creations and
-    the noms about which they should be notified.
+    the noms about which they should be notified. If a NominationCache is
+    given, only nominations changed since it was last updated are parsed.
     """
     people_to_notify = dict()
     cat_dykn = pywikibot.Category(wiki, "Category:Pending DYK nominations")
     print("Getting nominations from " + cat_dykn.title() + "...")
-    for nomination in pagegenerators.CategorizedPageGenerator(
-            cat_dykn, content=True):
-        wikitext = nomination.get()
-        if not BAD_TEXT.search(wikitext):
-            who_to_nominate = get_who_to_nominate(wikitext,
-                                                  nomination.title())
-            for username, nomination in who_to_nominate.items():
-                people_to_notify[username] = people_to_notify.get(
-                    username, []) + [nomination]
+    if cache:
+        results = get_nominations_incrementally(wiki, cat_dykn.title(), cache,
+                                                jobs)
+    else:
+        noms = ((nom.get(), nom.title()) for nom in
+                pagegenerators.CategorizedPageGenerator(cat_dykn, content=True))
+        results = parse_nominations(noms, jobs)
+
+    for who_to_nominate in results:
+        for username, nomination in who_to_nominate.items():
+            people_to_notify.setdefault(username, []).append(nomination)
 
     print("Found {} people to notify.".format(len(people_to_notify)))
     return people_to_notify
 
+def parse_nominations(noms, jobs=1):
+    """
+    Yields the people to notify for each (wikitext, title) tuple, in order.
+    The parsing is CPU-bound, so it's spread over jobs processes.
+    """
+    if jobs <= 1:
+        for nom in noms:
+            yield nominations.parse_nomination(nom)
+        return
+
+    pool = multiprocessing.Pool(jobs)
+    try:
+        for who_to_nominate in pool.imap(nominations.parse_nomination, noms,
+                                         chunksize=8):
+            yield who_to_nominate
+    finally:
+        pool.close()
+        pool.join()
+
+def get_nominations_incrementally(wiki, category, cache, jobs=1):
+    """
+    Yields the people to notify for each nomination in the category, just
+    like parse_nominations would. Only nominations whose latest revision
+    differs from the one in the cache are downloaded and parsed.
+    """
+    api = batchquery.CountingApi(make_api(wiki))
+    latest_revisions = batchquery.category_revisions(api, category)
+    cache.retain(latest_revisions)
+    cached_revisions = cache.revisions()
+    changed = [title for title, revid in latest_revisions.items()
+               if cached_revisions.get(title) != revid]
+    print("%d of %d nominations changed since the last run." %
+          (len(changed), len(latest_revisions)))
+
+    noms = list(batchquery.latest_texts(api, changed))
+    results = parse_nominations((nom[:2] for nom in noms), jobs)
+    for who_to_nominate, nom in zip(results, noms):
+        cache.update(nom[1], nom[2], who_to_nominate)
+    print("Updated the nomination cache in %d API requests." % api.requests)
+
+    return cache.results()
+
 # pylint: disable=too-many-branches
 # pylint: disable=too-many-locals
-def prune_list_of_people(people_to_notify):
+def prune_list_of_people(people_to_notify, wiki, store):
     "Removes people who shouldn't be notified from the list."
 
-    # Define a couple of helper functions...
-
-    # ... one purely for logging purposes,
+    # Define a helper function purely for logging purposes.
     def print_people_left(what_was_removed):
         "Print the number of people left after removing something."
 
@@ -100,69 +192,37 @@ def prune_list_of_people(people_to_notify):
         #                            [])),
         #       what_was_removed))
 
-    # ... and another simply to save keystrokes.
-    def user_talk_pages():
-        "A generator for valid user talk pages."
-        titles = ["User talk:" + name for name in people_to_notify.keys()]
-        for user_talk_page in [page for page in
-                               pagegenerators.PagesFromTitlesGenerator(titles)
-                               if page.exists() and not page.isRedirectPage()]:
-
-            # First, a sanity check
-            username = user_talk_page.title(withNamespace=False)
-            if username not in people_to_notify:
-                continue
-
-            # Then yield the page and username
-            yield (user_talk_page, username)
-
     # Prune empty entries
     people_to_notify = {k: v for k, v in people_to_notify.items() if k}
     print_people_left("empty entries")
 
+    # Look up every talk page we might need in as few requests as possible
+    api = batchquery.CountingApi(make_api(wiki))
+    talk_pages = batchquery.resolve_talk_pages(api, people_to_notify.keys())
+    print("Checked %d talk pages in %d API requests instead of %d." %
+          (len(talk_pages), api.requests, 2 * len(talk_pages)))
+
     # Prune talk pages that don't exist
-    user_talk_titles = ["User talk:" + name for name in people_to_notify.keys()]
-    titles_gen = pagegenerators.PagesFromTitlesGenerator(user_talk_titles)
-    usernames_without_talk_pages = [page.title(withNamespace=False)
-            for page in titles_gen]
-    for each_username in usernames_without_talk_pages:
-        del people_to_notify[each_username]
+    people_to_notify = {k: v for k, v in people_to_notify.items()
+                        if talk_pages[k].exists}
+    print_people_left("nonexistent talk pages")
 
     # Prune people I've already notified
-    with open(CONFIG.get("dyknotifier", "ALREADY_NOTIFIED_FILE")) as already_notified_file:
-        try:
-            already_notified_data = json.load(already_notified_file)
-        except ValueError as error:
-            if error.message != "No JSON object could be decoded":
-                raise
-            else:
-                already_notified_data = {}
-
-        # Since the outer dict in the file is keyed on month string,
-        # smush all the values together to get a dict keyed on username
-        already_notified = {}
-        for month_dict in already_notified_data.values():
-            for month_username, month_items in month_dict.items():
-                already_notified[month_username] =\
-                    already_notified.get(month_username, []) + month_items
-
-        # Now that we've built a dict, filter the list for each username
-        for username, prior_nominations in already_notified.items():
-            if username not in people_to_notify:
-                continue
-
-            prior_nominations = [CONFIG.get("dyknotifier", "NOMINATION_TEMPLATE") + x
-                                 for x in prior_nominations]
-            proposed = set(people_to_notify[username])
-            people_to_notify[username] = list(proposed -
-                                              set(prior_nominations))
-        people_to_notify = {k: v for k, v in people_to_notify.items() if v}
-        print_people_left("already-notified people")
+    prefix_length = len(CONFIG.get("dyknotifier", "NOMINATION_TEMPLATE"))
+    for username, proposed in people_to_notify.items():
+        people_to_notify[username] = [
+            nom for nom in proposed
+            if not store.was_notified(username, nom[prefix_length:])]
+    people_to_notify = {k: v for k, v in people_to_notify.items() if v}
+    print_people_left("already-notified people")
 
     # Prune user talk pages that link to this nom.
-    for user_talk_page, username in user_talk_pages():
+    for username in people_to_notify:
+        talk_page = talk_pages[username]
+        if talk_page.redirect or talk_page.text is None:
+            continue
         people_to_notify[username] = [nom for nom in people_to_notify[username]
-                                      if nom not in user_talk_page.get()]
+                                      if nom not in talk_page.text]
     people_to_notify = {k: v for k, v in people_to_notify.items() if v}
     print_people_left("linked people")
 
@@ -171,9 +231,8 @@ def prune_list_of_people(people_to_notify):
 # Disabling pylint because breaking stuff out into
 # methods would spill too much into global scope
 
-# pylint: disable=too-many-branches
-# pylint: disable=too-many-statements
-def notify_people(people_to_notify, args, wiki):
+# pylint: disable=too-many-locals
+def notify_people(people_to_notify, args, wiki, store):
     "Adds a message to people who ought to be notified about their DYK noms."
 
     # Check if there's anybody to notify
@@ -181,171 +240,90 @@ def notify_people(people_to_notify, args, wiki):
         print("Nobody to notify.")
         return
 
-    # Do the notification
-    people_notified = dict()
-
-    def write_notified_people_to_file():
-        """Update the file of notified people with people_notified."""
-        this_month = datetime.now().strftime("%B %Y")
-        with open(CONFIG.get("dyknotifier", "ALREADY_NOTIFIED_FILE")) as already_notified_file:
-            try:
-                already_notified = json.load(already_notified_file)
-            except ValueError as error:
-                if error.message != "No JSON object could be decoded":
-                    raise
-                else:
-                    already_notified = {} # eh, we'll be writing to it anyway
-
-            already_notified_this_month = already_notified.get(this_month, {})
-            with open(CONFIG.get("dyknotifier", "ALREADY_NOTIFIED_FILE"), "w") as already_notified_file:
-                usernames = set(already_notified_this_month.keys() +
-                                people_notified.keys())
-                for username in usernames:
-                    already_notified_this_month[username] = list(set(
-                        already_notified_this_month.get(username, []) +\
-                        people_notified.get(username, [])))
-
-                already_notified[this_month] = already_notified_this_month
-
-                # Remove all data from more than a year ago
-                a_year_ago = datetime.today() - timedelta(365)
-                def not_too_old(month):
-                    """True if the given month was less than a year ago."""
-                    return datetime.strptime(month, "%B %Y") > a_year_ago
-                already_notified = {k: v for k, v in already_notified.items()
-                                    if not_too_old(k)}
-
-                json.dump(already_notified, already_notified_file)
+    # Remove namespaces from the nom names.
+    prefix_length = len(CONFIG.get("dyknotifier", "NOMINATION_TEMPLATE"))
+    people_to_notify = {person: [name[prefix_length:] for name in nom_names]
+                        for person, nom_names in people_to_notify.items()}
 
-        print("Wrote %d people for %d nominations this month." %
-              (len(already_notified_this_month),
-               len(functools.reduce(operator.add,
-                                    already_notified_this_month.values(),
-                                    []))))
-
-    notify_iter = zip(people_to_notify.items(),
-                      reversed(range(len(people_to_notify))))
-    for (person, nom_names), counter in notify_iter:
-        if args.count:
-            edits_made = len(functools.reduce(operator.add,
-                                              people_notified.values(), []))
-            if edits_made >= args.count:
-                print("%d notified; exiting.", edits_made)
-                write_notified_people_to_file()
-                sys.exit(0)
-
-        # Remove namespaces from the nom names.
-        nom_names = [name[34:] for name in nom_names]
-
-        # Format nom names into a string
-        nom_names_string = "".join(name.encode("utf-8") for name in nom_names)
+    # Work out all of the messages before we start saving anything
+    missing_subpages = find_missing_subpages(
+        wiki, [name for nom_names in people_to_notify.values()
+               for name in nom_names])
 
-        if args.interactive:
-            print("About to notify {} for {}.".format(person.encode("utf-8"),
-                                                      nom_names_string))
-            choice = raw_input("What (s[kip], c[ontinue], q[uit])? ")
-            if choice[0] == "s":
-                if prompt.yn("Because I've already notified them?"):
-                    people_notified[person] = people_notified.get(
-                        person, []) + nom_names
-                print("Skipping " + person + ".")
-                continue
-            elif choice[0] == "q":
-                print("Stop requested; exiting.")
-                write_notified_people_to_file()
-                sys.exit(0)
+    def save(notification):
+        "Append the message to the person's talk page. True if it worked."
+        person, nom_names, message = notification
+        nom_names_string = "".join(name.encode("utf-8") for name in nom_names)
         talkpage = pywikibot.Page(wiki, title="User talk:" + person)
         try:
             summary = CONFIG.get("dyknotifier", "SUMMARY").format(nom_names_string)
-            talkpage.save(appendtext=generate_message(nom_names, wiki),
-                          comment=summary)
-            print("Success! Notified %s because of %s. (%d left)" %
-                  (person.encode("utf-8"), nom_names_string, counter))
-            people_notified[person] = people_notified.get(person,
-                                                          []) + nom_names
+            talkpage.save(appendtext=message, comment=summary)
+            print("Success! Notified %s because of %s." %
+                  (person.encode("utf-8"), nom_names_string))
+            return True
         except pywikibot.Error as error:
             print("Couldn't notify {} because of {} - result: {}".format(person, nom_names_string, str(error)))
-        except (KeyboardInterrupt, SystemExit):
-            write_notified_people_to_file()
-            raise
         except UnicodeEncodeError as error2:
             traceback.print_exc()
             print("Unicode encoding error notifiying {} about {}: {}".format(
                     person.encode("utf-8"), nom_names_string, str(error2)))
+        return False
+
+    def journal(notification):
+        "Record a successful notification right away."
+        person, nom_names, _ = notification
+        store.add(person, nom_names)
+
+    notifications = notifyqueue.NotificationQueue(
+        save, journal, workers=1 if args.interactive else args.workers,
+        edits_per_minute=args.edits_per_minute, limit=args.count)
+    try:
+        for counter, (person, nom_names) in enumerate(
+                people_to_notify.items()):
+            if args.interactive:
+                print("About to notify {} for {}. ({} left)".format(
+                    person.encode("utf-8"),
+                    "".join(name.encode("utf-8") for name in nom_names),
+                    len(people_to_notify) - counter - 1))
+                choice = raw_input("What (s[kip], c[ontinue], q[uit])? ")
+                if choice[0] == "s":
+                    if prompt.yn("Because I've already notified them?"):
+                        store.add(person, nom_names)
+                    print("Skipping " + person + ".")
+                    continue
+                elif choice[0] == "q":
+                    print("Stop requested; exiting.")
+                    break
+
+            message = generate_message(nom_names, missing_subpages)
+            notifications.put((person, nom_names, message))
+
+        edits_made = notifications.join()
+        print("%d notified; exiting." % edits_made)
+    finally:
+        # Remove all data from more than a year ago
+        store.expire()
+        print("Wrote %d people for %d nominations this month." %
+              store.month_counts())
 
-    write_notified_people_to_file()
+def find_missing_subpages(wiki, nom_names):
+    """
+    Of the nom subpage names that might not correspond to articles (the ones
+    with commas), return the set of those that don't.
+    """
+    maybe_multiple = set(name for name in nom_names if "," in name)
+    api = make_api(wiki)
+    return set(name for name, page in batchquery.query_titles(
+        api, maybe_multiple, {"prop": "info"})
+               if not page or page.get("missing") or page.get("invalid"))
 
-def get_who_to_nominate(wikitext, title):
+def generate_message(nom_names, missing_subpages):
     """
-    Given the wikitext of a DYK nom and its title, return a dict of user
-    talkpages of who to notify and the titles of the noms for which they
-    should be notified).
+    Returns the template message to be placed on the nominator's talk page.
+    Nom subpage names in missing_subpages are flagged as not corresponding
+    to articles in the hook.
     """
-    if "#REDIRECT" in wikitext:
-        print(title + " is a redirect.")
-        return {}
-
-    if "<small>" not in wikitext:
-        print("<small> not found in " + title)
-        return {}
-
-    soup = BeautifulSoup(wikitext, "lxml")
-    small_tags = [unicode(x.string) for x in soup.find_all("small")]
-    def is_nom_string(text):
-        "Is text the line in a DYK nom reading 'Created by... Nominated by...'?"
-        return u"Nominated by" in text
-    nom_lines = [tag for tag in small_tags if is_nom_string(tag)]
-    if len(nom_lines) != 1:
-        print(u"Small tags for " + title + u": " + unicode(small_tags))
-        return {}
-
-    # Every user whose talk page is linked to within the <small> tags
-    # is assumed to have contributed. Looking for piped links to user
-    # talk pages.
-    usernames = usernames_from_text_with_sigs(nom_lines[0])
-
-    # If there aren't any usernames, WTF and exit
-    if len(usernames) == 0:
-        print("WTF, no usernames for " + title.encode("utf-8"))
-        return {}
-
-    # The last one is the nominator.
-    nominator = usernames[-1]
-
-    # Removing all instances of nominator from usernames, since he or she
-    # already knows about the nomination
-    while nominator in usernames:
-        usernames.remove(nominator)
-
-    # Removing people who have contributed to the discussion
-    discussion_text = wikitext[wikitext.find("</small>") + len("</small>"):]
-    discussion = usernames_from_text_with_sigs(discussion_text)
-    usernames = [user for user in usernames if user not in discussion]
-
-    result = dict()
-    for username in usernames:
-        result[username] = title
-
-    return result
-
-def usernames_from_text_with_sigs(wikitext):
-    "Returns the users whose talk pages are linked to in the wikitext."
-    return [wikitext[m.end():m.end()+wikitext[m.end():].find("|")]\
-            for m in re.finditer(r"User talk:", wikitext)]
-
-def generate_message(nom_names, wiki):
-    "Returns the template message to be placed on the nominator's talk page."
-
-    # Check for nom subpage names that don't match up to articles in the hook
-    def flag_subpage(nom_subpage_name):
-        "Flag nom subpage names that don't correspond to articles."
-        if "," not in nom_subpage_name:
-            return (nom_subpage_name, False)
-
-        the_subpage = pywikibot.Page(wiki, title=nom_subpage_name)
-
-        return (nom_subpage_name, not the_subpage.exists())
-    nom_names = [flag_subpage(x) for x in nom_names]
+    nom_names = [(x, x in missing_subpages) for x in nom_names]
     message = u"\n\n{{{{subst:DYKNom|{0}|passive=yes}}}}"
     flagged_message = u"\n\n{{{{subst:DYKNom||passive=yes|section={0}}}}}"
     multiple_message = u"\n\n{{{{subst:DYKNom|{0}|passive=yes|multiple=yes}}}}"
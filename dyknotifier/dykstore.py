@@ -0,0 +1,152 @@
+"""
+A persistent record of who has already been notified about which
+nominations, kept in SQLite so that lookups and expiry don't require loading
+and rewriting everything.
+"""
+from datetime import datetime, timedelta
+import json
+import sqlite3
+import threading
+
+# The old JSON file was keyed on month strings like "March 2016"
+JSON_MONTH_FORMAT = "%B %Y"
+
+# Months are stored as "2016-03" so they sort (and range-delete) correctly
+MONTH_FORMAT = "%Y-%m"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS notified (
+    username TEXT NOT NULL,
+    nomination TEXT NOT NULL,
+    month TEXT NOT NULL,
+    PRIMARY KEY (username, nomination)
+);
+CREATE INDEX IF NOT EXISTS notified_month ON notified (month);
+CREATE TABLE IF NOT EXISTS nominations (
+    title TEXT PRIMARY KEY,
+    revid INTEGER NOT NULL,
+    people TEXT NOT NULL
+);
+"""
+
+def month_key(when):
+    """Turns a datetime into the month string used in the database."""
+    return when.strftime(MONTH_FORMAT)
+
+class NotifiedStore(object):
+    """
+    The set of (username, nomination) pairs we've notified people about,
+    each tagged with the month it happened in. Nominations are stored
+    without the "Template:Did you know nominations/" prefix.
+    """
+
+    def __init__(self, path):
+        # Notifications are recorded from notifyqueue's worker threads as
+        # well as the main thread, so every use of the shared connection
+        # goes through the lock.
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        """Close the underlying database."""
+        with self.lock:
+            self.connection.close()
+
+    def was_notified(self, username, nomination):
+        """Have we notified this user about this nomination before?"""
+        with self.lock:
+            cursor = self.connection.execute(
+                "SELECT 1 FROM notified WHERE username = ? AND nomination = ?",
+                (username, nomination))
+            return cursor.fetchone() is not None
+
+    def add(self, username, nominations, when=None):
+        """Record that the user was notified about all of the nominations."""
+        month = month_key(when or datetime.now())
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO notified VALUES (?, ?, ?)",
+                [(username, nomination, month) for nomination in nominations])
+
+    def expire(self, now=None):
+        """Forget everything from months that started more than a year ago."""
+        a_year_ago = (now or datetime.today()) - timedelta(365)
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM notified WHERE month <= ?",
+                                    (month_key(a_year_ago),))
+
+    def month_counts(self, when=None):
+        """Returns (people, nominations) notified in the given month."""
+        with self.lock:
+            cursor = self.connection.execute(
+                "SELECT COUNT(DISTINCT username), COUNT(*) FROM notified "
+                "WHERE month = ?", (month_key(when or datetime.now()),))
+            return cursor.fetchone()
+
+    def import_json(self, json_path):
+        """
+        One-time import from the old already-notified file, a JSON object
+        mapping month strings to objects mapping usernames to lists of
+        nominations. Returns the number of pairs imported.
+        """
+        with open(json_path) as json_file:
+            try:
+                months = json.load(json_file)
+            except ValueError:
+                months = {}
+
+        rows = []
+        for month, month_dict in months.items():
+            month = month_key(datetime.strptime(month, JSON_MONTH_FORMAT))
+            for username, nominations in month_dict.items():
+                rows.extend((username, nomination, month)
+                            for nomination in nominations)
+
+        # Oldest first, so a pair notified twice ends up with its newest month
+        rows.sort(key=lambda row: row[2])
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO notified VALUES (?, ?, ?)", rows)
+        return len(rows)
+
+class NominationCache(object):
+    """
+    The revision ID each pending nomination had when it was last parsed, and
+    who it said to notify, so unchanged nominations needn't be downloaded or
+    parsed again. Lives in the same database file as NotifiedStore.
+    """
+
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        """Close the underlying database."""
+        self.connection.close()
+
+    def revisions(self):
+        """Returns a dict from nomination title to the revid last parsed."""
+        return dict(self.connection.execute(
+            "SELECT title, revid FROM nominations"))
+
+    def update(self, title, revid, people):
+        """Record the result of parsing a nomination at some revision."""
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO nominations VALUES (?, ?, ?)",
+                (title, revid, json.dumps(people)))
+
+    def retain(self, titles):
+        """Forget every nomination that isn't in titles (e.g. closed ones)."""
+        titles = set(titles)
+        gone = [(title,) for title in self.revisions() if title not in titles]
+        with self.connection:
+            self.connection.executemany(
+                "DELETE FROM nominations WHERE title = ?", gone)
+
+    def results(self):
+        """Yields the stored result for every nomination."""
+        for (people,) in self.connection.execute(
+                "SELECT people FROM nominations"):
+            yield json.loads(people)
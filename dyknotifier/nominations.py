@@ -0,0 +1,92 @@
+"""
+Works out who should be notified about a DYK nomination, given its wikitext.
+
+This doesn't need Pywikibot or an HTML parser, so it's cheap to run in worker
+processes and easy to test.
+"""
+import re
+import sys
+
+BAD_TEXT = re.compile(r"(Self(-|\s)nominated|Category:((f|F)ailed|(p|P)assed) DYK)",
+                      re.I)
+
+# The contents of a <small> tag, as long as nothing else is nested inside it
+SMALL_TAG = re.compile(r"<small>(.*?)</small>", re.DOTALL | re.IGNORECASE)
+NESTED_TAG = re.compile(r"<[a-zA-Z/!]")
+
+USER_TALK = "User talk:"
+
+def printable(text):
+    """
+    Titles are encoded before printing on Python 2, where stdout may not be
+    a UTF-8 terminal (e.g. under cron or in a pool worker).
+    """
+    return text.encode("utf-8") if sys.version_info[0] < 3 else text
+
+def parse_nomination(wikitext_and_title):
+    """
+    Given a (wikitext, title) tuple for a DYK nom, return the dict that
+    get_who_to_nominate would, or an empty one if the nom is closed or a
+    self-nomination. Takes a tuple so it can be mapped over by a Pool.
+    """
+    wikitext, title = wikitext_and_title
+    if BAD_TEXT.search(wikitext):
+        return {}
+    return get_who_to_nominate(wikitext, title)
+
+def get_who_to_nominate(wikitext, title):
+    """
+    Given the wikitext of a DYK nom and its title, return a dict of user
+    talkpages of who to notify and the titles of the noms for which they
+    should be notified).
+    """
+    if "#REDIRECT" in wikitext:
+        print(printable(title) + " is a redirect.")
+        return {}
+
+    if "<small>" not in wikitext:
+        print("<small> not found in " + printable(title))
+        return {}
+
+    # Tags with other markup inside them can't be the plain-text
+    # "Created by... Nominated by..." line, so they're skipped.
+    small_tags = [match.group(1) for match in SMALL_TAG.finditer(wikitext)
+                  if not NESTED_TAG.search(match.group(1))]
+    nom_lines = [tag for tag in small_tags if u"Nominated by" in tag]
+    if len(nom_lines) != 1:
+        print("Small tags for " + printable(title) + ": " + repr(small_tags))
+        return {}
+
+    # Every user whose talk page is linked to within the <small> tags
+    # is assumed to have contributed. Looking for piped links to user
+    # talk pages.
+    usernames = usernames_from_text_with_sigs(nom_lines[0])
+
+    # If there aren't any usernames, WTF and exit
+    if len(usernames) == 0:
+        print("WTF, no usernames for " + printable(title))
+        return {}
+
+    # The last one is the nominator, who already knows about the nomination.
+    nominator = usernames[-1]
+    usernames = [user for user in usernames if user != nominator]
+
+    # Removing people who have contributed to the discussion
+    discussion_start = wikitext.find("</small>") + len("</small>")
+    discussion = set(usernames_from_text_with_sigs(wikitext, discussion_start))
+    return {user: title for user in usernames if user not in discussion}
+
+def usernames_from_text_with_sigs(wikitext, start=0):
+    """
+    Returns the users whose talk pages are linked to in the wikitext (from
+    the given offset on): whatever follows each "User talk:" up to the next
+    pipe, or an empty string if there is no later pipe.
+    """
+    usernames = []
+    position = wikitext.find(USER_TALK, start)
+    while position != -1:
+        name_start = position + len(USER_TALK)
+        pipe = wikitext.find("|", name_start)
+        usernames.append(wikitext[name_start:pipe] if pipe != -1 else u"")
+        position = wikitext.find(USER_TALK, name_start)
+    return usernames
@@ -0,0 +1,118 @@
+"""
+A queue that saves notifications from a few threads at once without going
+over an edit rate, and records each one the moment it succeeds.
+
+Like batchquery, this doesn't know about Pywikibot; the caller passes in
+functions that do the actual saving and recording.
+"""
+import threading
+import time
+import traceback
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+class RateLimiter(object):
+    """Spaces out calls to wait() so they happen at most per_minute times a minute."""
+
+    def __init__(self, per_minute=None):
+        self.interval = 60.0 / per_minute if per_minute else 0
+        self.lock = threading.Lock()
+        self.next_time = 0
+
+    def wait(self):
+        """Block until it's our turn."""
+        with self.lock:
+            now = time.time()
+            delay = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+class NotificationQueue(object):
+    """
+    Calls save(notification) for every notification put on the queue, from
+    up to workers threads, and journal(notification) (one at a time) after
+    each save that returns True. Once limit saves have succeeded, the rest
+    of the queue is dropped. A journal that raises is reported, not fatal.
+    """
+
+    def __init__(self, save, journal, workers=1, edits_per_minute=None,
+                 limit=None):
+        self.save = save
+        self.journal = journal
+        self.limit = limit
+        self.limiter = RateLimiter(edits_per_minute)
+        self.lock = threading.Condition()
+        self.journal_lock = threading.Lock()
+        self.queue = queue.Queue()
+        self.edits = 0
+        self.in_flight = 0
+        self.threads = [threading.Thread(target=self.work)
+                        for _ in range(workers)]
+        for thread in self.threads:
+            thread.daemon = True
+            thread.start()
+
+    def put(self, notification):
+        """Queue up a notification."""
+        self.queue.put(notification)
+
+    def reserve(self):
+        """
+        Claim one of the remaining edits under the limit, if there are any.
+        If the only thing in the way is saves that might still fail, wait
+        for them to finish first.
+        """
+        with self.lock:
+            while (self.limit and self.in_flight and
+                   self.edits + self.in_flight >= self.limit):
+                self.lock.wait()
+            if self.limit and self.edits >= self.limit:
+                return False
+            self.in_flight += 1
+            return True
+
+    def work(self):
+        """The loop each worker thread runs."""
+        while True:
+            notification = self.queue.get()
+            if notification is None:
+                return
+            if not self.reserve():
+                continue
+
+            self.limiter.wait()
+            succeeded = False
+            try:
+                succeeded = self.save(notification)
+            finally:
+                with self.lock:
+                    self.in_flight -= 1
+                    if succeeded:
+                        self.edits += 1
+                    self.lock.notify_all()
+
+            # Outside the condition, so a slow or failing journal can't keep
+            # the other workers waiting in reserve()
+            if succeeded:
+                with self.journal_lock:
+                    try:
+                        self.journal(notification)
+                    except Exception: # pylint: disable=broad-except
+                        traceback.print_exc()
+                        print("Couldn't record a successful notification: %r" %
+                              (notification,))
+
+    def join(self):
+        """Wait for everything queued so far to be saved; returns the edit count."""
+        for _ in self.threads:
+            self.queue.put(None)
+
+        # Join with a timeout so the main thread still sees KeyboardInterrupt
+        for thread in self.threads:
+            while thread.is_alive():
+                thread.join(0.5)
+        return self.edits
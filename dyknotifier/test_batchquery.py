@@ -0,0 +1,120 @@
+import unittest
+
+from batchquery import (CountingApi, category_revisions, latest_texts,
+                        query_titles, resolve_talk_pages)
+
+class FakeApi(object):
+    """
+    Answers action=query requests for titles out of a dict of title -> page,
+    the way the API would with formatversion=2. Titles with a lowercase first
+    letter get normalized, and revisions are handed out one page at a time
+    (with a continuation) if split_revisions is set.
+    """
+    def __init__(self, pages, split_revisions=False):
+        self.pages = pages
+        self.split_revisions = split_revisions
+        self.requests = []
+
+    def __call__(self, params):
+        self.requests.append(params)
+        titles = params["titles"].split("|")
+        query = {"pages": [], "normalized": []}
+        for title in titles:
+            prefix, _, name = title.partition(":")
+            normalized = prefix + ":" + name[:1].upper() + name[1:]
+            if normalized != title:
+                query["normalized"].append({"from": title, "to": normalized})
+            if normalized in self.pages:
+                page = dict(self.pages[normalized], title=normalized)
+            else:
+                page = {"title": normalized, "missing": True}
+            query["pages"].append(page)
+
+        response = {"query": query}
+        if self.split_revisions:
+            already_sent = int(params.get("rvcontinue", 0))
+            with_revisions = [page for page in query["pages"]
+                              if "revisions" in page]
+            for index, page in enumerate(with_revisions):
+                if index != already_sent:
+                    del page["revisions"]
+            if already_sent + 1 < len(with_revisions):
+                response["continue"] = {"rvcontinue": str(already_sent + 1),
+                                        "continue": "||"}
+        return response
+
+def talk_page(text, redirect=False):
+    page = {"revisions": [{"slots": {"main": {"content": text}}}]}
+    if redirect:
+        page["redirect"] = True
+    return page
+
+class TestQueryTitles(unittest.TestCase):
+    def test_batches(self):
+        api = CountingApi(FakeApi({}))
+        titles = ["User talk:U%d" % i for i in range(120)]
+        results = list(query_titles(api, titles, {}, batch_size=50))
+        self.assertEqual(api.requests, 3)
+        self.assertEqual([title for title, _ in results], titles)
+
+    def test_normalization(self):
+        api = FakeApi({"User talk:Foo": talk_page("hi")})
+        results = dict(query_titles(api, ["User talk:foo"], {}))
+        self.assertEqual(results["User talk:foo"]["title"], "User talk:Foo")
+
+    def test_continuation(self):
+        pages = {"User talk:A": talk_page("a"), "User talk:B": talk_page("b")}
+        api = CountingApi(FakeApi(pages, split_revisions=True))
+        results = dict(query_titles(api, sorted(pages), {}))
+        self.assertEqual(api.requests, 2)
+        self.assertTrue(all(len(page["revisions"]) == 1
+                            for page in results.values()))
+
+class TestCategoryRevisions(unittest.TestCase):
+    def test_continuation(self):
+        responses = [
+            {"query": {"pages": [{"title": "A", "lastrevid": 1},
+                                 {"title": "B", "lastrevid": 2}]},
+             "continue": {"gcmcontinue": "page|C", "continue": "gcmcontinue||"}},
+            {"query": {"pages": [{"title": "C", "lastrevid": 3}]}}]
+        requests = []
+        def api(params):
+            requests.append(params)
+            return responses[len(requests) - 1]
+        self.assertEqual(category_revisions(api, "Category:Foo"),
+                         {"A": 1, "B": 2, "C": 3})
+        self.assertEqual(requests[1]["gcmcontinue"], "page|C")
+
+class TestLatestTexts(unittest.TestCase):
+    def test_skips_pages_without_text(self):
+        api = FakeApi({
+            "Template:Did you know nominations/A": {
+                "revisions": [{"revid": 1, "slots": {"main": {"content": "a"}}}]},
+            "Template:Did you know nominations/B": {
+                "revisions": [{"revid": 2, "slots": {"main": {"texthidden": True}}}]}})
+        titles = ["Template:Did you know nominations/" + name for name in "ABC"]
+        self.assertEqual(list(latest_texts(api, titles)), [("a", titles[0], 1)])
+
+class TestResolveTalkPages(unittest.TestCase):
+    def setUp(self):
+        self.api = CountingApi(FakeApi({
+            "User talk:Alice": talk_page("Hello Alice"),
+            "User talk:Bob": talk_page("#REDIRECT [[User talk:Robert]]",
+                                       redirect=True)}))
+
+    def test_resolve(self):
+        result = resolve_talk_pages(self.api, ["Alice", "Bob", "Carol"])
+        self.assertEqual(result["Alice"], (True, False, "Hello Alice"))
+        self.assertTrue(result["Bob"].exists)
+        self.assertTrue(result["Bob"].redirect)
+        self.assertFalse(result["Carol"].exists)
+        self.assertEqual(self.api.requests, 1)
+
+    def test_many_users(self):
+        usernames = ["User %d" % i for i in range(500)]
+        result = resolve_talk_pages(self.api, usernames)
+        self.assertEqual(len(result), 500)
+        self.assertEqual(self.api.requests, 10)
+
+if __name__ == "__main__":
+    unittest.main()
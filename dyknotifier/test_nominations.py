@@ -0,0 +1,65 @@
+import unittest
+
+from benchmark_nominations import legacy_who_to_nominate
+from nominations import (get_who_to_nominate, parse_nomination,
+                         usernames_from_text_with_sigs)
+
+TITLE = u"Template:Did you know nominations/Foo"
+
+NOMINATION = u"""{{DYKsubpage
+|monthyear=October 2016
+|passed=
+|2=
+====Foo====
+{{DYK conditions}}
+* ... that '''[[Foo]]''' is a bar? Source: [http://example.com]
+<small>Created by [[User:Alice|Alice]] ([[User talk:Alice|talk]]) and [[User:Bob|Bob]] ([[User talk:Bob|talk]]). Nominated by [[User:Carol|Carol]] ([[User talk:Carol|talk]]) at 12:00, 1 October 2016 (UTC).</small>
+* {{DYKmake|Foo|Alice}}
+:Looks good. [[User:Bob|Bob]] ([[User talk:Bob|talk]]) 13:00, 2 October 2016 (UTC)
+}}"""
+
+SELF_NOMINATION = NOMINATION.replace(u"Created by", u"Self-nominated; created by")
+
+CORPUS = [
+    NOMINATION,
+    NOMINATION.replace(u":Looks good.", u":Looks good. [[User talk:Dave|Dave]]"),
+    NOMINATION.replace(u"([[User talk:Carol|talk]])", u""),
+    NOMINATION.replace(u"Nominated by", u"Nominated by [[User talk:Alice|Alice]] and"),
+    NOMINATION.replace(u"bar? Source: [http://example.com]",
+                       u"bar?<small>Source: [http://example.com]</small>"),
+    NOMINATION.replace(u"bar? Source", u"bar?<small>Nominated by nobody.</small> Source"),
+    NOMINATION.replace(u"<small>Created by", u"<small><b>Created</b> by"),
+    NOMINATION.replace(u"<small>", u""),
+    u"#REDIRECT [[Template:Did you know nominations/Bar]]",
+    u"<small>Nominated by [[User:Erin|Erin]]</small>",
+]
+
+class TestNominations(unittest.TestCase):
+    def test_basic(self):
+        self.assertEqual(get_who_to_nominate(NOMINATION, TITLE),
+                         {u"Alice": TITLE})
+
+    def test_bad_text(self):
+        self.assertEqual(parse_nomination((SELF_NOMINATION, TITLE)), {})
+        self.assertEqual(parse_nomination((NOMINATION, TITLE)),
+                         {u"Alice": TITLE})
+
+    def test_usernames(self):
+        self.assertEqual(usernames_from_text_with_sigs(
+            u"[[User talk:A|a]] [[User talk:B]] [[User talk:C|c]]"),
+                         [u"A", u"B]] [[User talk:C", u"C"])
+        self.assertEqual(usernames_from_text_with_sigs(u"[[User talk:A]]"),
+                         [u""])
+
+    def test_same_as_beautifulsoup(self):
+        try:
+            import bs4
+            import lxml
+        except ImportError:
+            self.skipTest("beautifulsoup4 and lxml are needed for this test")
+        for wikitext in CORPUS:
+            self.assertEqual(get_who_to_nominate(wikitext, TITLE),
+                             legacy_who_to_nominate(wikitext, TITLE))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+import threading
+import time
+import unittest
+
+from notifyqueue import NotificationQueue, RateLimiter
+
+class FakeWiki(object):
+    """
+    Stands in for the save and journal functions. Saves of notifications in
+    fail always fail; the journal raises if broken_journal is set. Records
+    what was saved and journaled, and checks nothing is journaled unsaved.
+    """
+    def __init__(self, fail=(), broken_journal=False):
+        self.fail = set(fail)
+        self.broken_journal = broken_journal
+        self.saved = []
+        self.journaled = []
+        self.lock = threading.Lock()
+
+    def save(self, notification):
+        time.sleep(0.01)
+        if notification in self.fail:
+            return False
+        with self.lock:
+            self.saved.append(notification)
+        return True
+
+    def journal(self, notification):
+        with self.lock:
+            assert notification in self.saved
+            self.journaled.append(notification)
+        if self.broken_journal:
+            raise IOError("disk full")
+
+def run_queue(wiki, notifications, **kwargs):
+    """Queues up the notifications and returns join()'s edit count."""
+    queue = NotificationQueue(wiki.save, wiki.journal, **kwargs)
+    for notification in notifications:
+        queue.put(notification)
+
+    # join() on another thread, so a deadlock fails the test instead of hanging it
+    result = []
+    joiner = threading.Thread(target=lambda: result.append(queue.join()))
+    joiner.daemon = True
+    joiner.start()
+    joiner.join(5)
+    if joiner.is_alive():
+        raise AssertionError("join() didn't return")
+    return result[0]
+
+class TestRateLimiter(unittest.TestCase):
+    def test_spacing(self):
+        limiter = RateLimiter(per_minute=60 * 50)
+        start = time.time()
+        for _ in range(5):
+            limiter.wait()
+        self.assertGreaterEqual(time.time() - start, 4 * 0.02 - 0.005)
+
+    def test_unlimited(self):
+        limiter = RateLimiter()
+        start = time.time()
+        for _ in range(100):
+            limiter.wait()
+        self.assertLess(time.time() - start, 0.5)
+
+class TestNotificationQueue(unittest.TestCase):
+    def test_everything_saved(self):
+        wiki = FakeWiki()
+        self.assertEqual(run_queue(wiki, range(20), workers=4), 20)
+        self.assertEqual(sorted(wiki.saved), list(range(20)))
+        self.assertEqual(sorted(wiki.journaled), list(range(20)))
+
+    def test_edit_cap(self):
+        wiki = FakeWiki()
+        self.assertEqual(run_queue(wiki, range(20), workers=4, limit=3), 3)
+        self.assertEqual(len(wiki.saved), 3)
+        self.assertEqual(sorted(wiki.journaled), sorted(wiki.saved))
+
+    def test_failed_saves_not_journaled_or_counted(self):
+        wiki = FakeWiki(fail=[0, 2, 4])
+        self.assertEqual(run_queue(wiki, range(6), workers=2, limit=3), 3)
+        self.assertEqual(sorted(wiki.saved), [1, 3, 5])
+        self.assertEqual(sorted(wiki.journaled), [1, 3, 5])
+
+    def test_journal_failure_does_not_deadlock(self):
+        wiki = FakeWiki(broken_journal=True)
+        self.assertEqual(run_queue(wiki, range(10), workers=3, limit=5), 5)
+        self.assertEqual(len(wiki.journaled), 5)
+
+if __name__ == "__main__":
+    unittest.main()
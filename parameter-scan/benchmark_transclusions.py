@@ -0,0 +1,158 @@
+"""
+Times transclusions.py against mwparserfromhell and against the regexes
+that other scripts here use to find templates, over a corpus of pages, and
+counts the transclusions each of them gets wrong.
+
+The corpus is a directory of .txt files, each holding the wikitext of one
+page; without one, 1000 made-up pages are used. Needs mwparserfromhell for
+that part of the comparison.
+"""
+import argparse
+import os
+import os.path
+import random
+import re
+import time
+
+from transclusions import COMMENT, find_transclusions, normalize_name, transclusions
+
+# What the scripts used before transclusions.py, by the template(s) they look for
+REGEXES = {
+    # parameter-scan
+    "Infobox Fraternity": re.compile(r"\{\{Infobox(\s|_)Fraternity(\{\{.+\}\}|[\s\S])+?\}\}",
+                                     flags=re.IGNORECASE),
+
+    # OLD/article-history-python
+    "Article history": re.compile(r"\{\{(article ?history[\s\S]*?)\}\}", flags=re.IGNORECASE),
+    "ITN talk": re.compile(r"\{\{(itn talk[\s\S]+?)\}\}", flags=re.IGNORECASE),
+    "On this day": re.compile(r"\{\{(on this day[\s\S]+?)\}\}", flags=re.IGNORECASE),
+    "DYK talk": re.compile(r"\{\{(dyk ?talk[\s\S]+?)\}\}", flags=re.IGNORECASE),
+
+    # wir-report
+    "db-": re.compile(r"\{\{(db-\w+).+?\}\}"),
+}
+NAMES = ["Infobox Fraternity", "Article history", "ArticleHistory", "ITN talk",
+         "On this day", "DYK talk", "DYKtalk"]
+
+def make_page(rng):
+    """Some made-up wikitext with the kinds of nesting (and broken markup) real pages have."""
+    cite = lambda n: ("<ref>{{cite web |url=http://example.org/%d?a=b |title=Page %d "
+                      "|website={{lang|fr|Ex}} |access-date=1 May 2020}}</ref>" % (n, n))
+    parts = []
+    if rng.random() < 0.3:
+        parts.append("{{Article history\n|action1=GAN\n|action1date=01:02, 3 May 2010 (UTC)"
+                     "\n|action1link=Talk:X/GA1\n|action1result={{{result|listed}}}\n"
+                     "|currentstatus=GA\n|topic={{#if:x|History|Other}}\n}}")
+        parts.append("{{ITN talk|date1=1 May 2020|oldid1=123}}")
+        parts.append("{{On this day|date1=2010-05-03|oldid1=456}}")
+        parts.append("{{DYK talk|3 May|2010|entry=... that [[X|x]] is {{convert|3|km}} long?}}")
+    if rng.random() < 0.1:
+        parts.append("{{db-g11|help=off}}")
+
+    # Broken markup, which is where a scanner is most likely to go wrong
+    if rng.random() < 0.2:
+        parts.append("See [[Alpha Beta\n\nand [[Gamma|the {{lang|el|Gamma}} chapter")
+    if rng.random() < 0.2:
+        parts.append("Stray {{ braces {{{ and }} here.")
+    if rng.random() < 0.2:
+        parts.append("<code>{{Infobox Fraternity|name=Example}}</code> "
+                     "<syntaxhighlight lang=\"wikitext\">{{DYK talk|</syntaxhighlight>")
+    motto = rng.choice(["<!-- Latin --> ''Semper''", "<math>{{x</math> ''Semper''",
+                        "<code>|}}</code>", "[[Semper|semper"])
+    parts.append("{{Infobox Fraternity\n| name = Alpha %d\n| image = Crest.png\n"
+                 "| type = {{nowrap|Social}} [[Fraternity|fraternity]]\n"
+                 "| founded = {{start date|1900|5|3}}\n| motto = %s\n"
+                 "| website = {{URL|example.org}}\n}}" % (rng.randint(0, 10 ** 6), motto))
+    if rng.random() < 0.2:
+        parts.append("[[File:Crest.png|thumb|The crest, from {{cite web|title=Crests}}")
+    for n in range(rng.randint(20, 200)):
+        parts.append("Some text about [[Topic %d|a topic]] and {{lang|de|etwas}}.%s"
+                     % (n, cite(n) if n % 3 == 0 else ""))
+    parts.append("{{Reflist}}\n[[Category:Fraternities]]")
+    return "\n\n".join(parts)
+
+def load_corpus(directory):
+    """Returns the wikitext of every .txt file in the directory."""
+    corpus = []
+    for filename in sorted(os.listdir(directory)):
+        if filename.endswith(".txt"):
+            with open(os.path.join(directory, filename), "rb") as page_file:
+                corpus.append(page_file.read().decode("utf-8"))
+    return corpus
+
+def timed(label, function):
+    """Returns function()'s result, after printing how long the corpus took."""
+    start = time.time()
+    result = function()
+    print("%-28s %8.3f s" % (label, time.time() - start))
+    return result
+
+def by_template(found):
+    """Groups (name, span, params) results by which of REGEXES' keys they're for."""
+    grouped = dict((key, []) for key in REGEXES)
+    for name, span, params in found:
+        name = normalize_name(name)
+        for key in REGEXES:
+            if key == "db-" and name.startswith("db-") or \
+                    name.replace(" ", "") == normalize_name(key).replace(" ", ""):
+                grouped[key].append((span, params))
+    return grouped
+
+def scan_with_transclusions(wikitext):
+    return by_template(transclusions(wikitext))
+
+def scan_with_regexes(wikitext):
+    return dict((key, [match.span() for match in regex.finditer(wikitext)])
+                for key, regex in REGEXES.items())
+
+def scan_with_mwparserfromhell(wikitext):
+    import mwparserfromhell
+    found = []
+    for template in mwparserfromhell.parse(wikitext).filter_templates(recursive=False):
+        params = {}
+        for param in template.params:
+            value = COMMENT.sub("", str(param.value))
+            params[COMMENT.sub("", str(param.name)).strip()] = value.strip() if param.showkey else value
+        found.append((str(template.name), None, params))
+    return by_template(found)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("corpus", nargs="?", help="Directory of saved pages.")
+    parser.add_argument("-n", "--pages", type=int, default=1000,
+                        help="How many pages to make up when no corpus is given.")
+    args = parser.parse_args()
+
+    if args.corpus:
+        corpus = load_corpus(args.corpus)
+    else:
+        rng = random.Random(0)
+        corpus = [make_page(rng) for _ in range(args.pages)]
+    print("%d pages, %.1f MB." % (len(corpus), sum(len(page) for page in corpus) / 1e6))
+
+    timed("find_transclusions", lambda: [list(find_transclusions(page, NAMES))
+                                         for page in corpus])
+    ours = timed("transclusions (all)", lambda: [scan_with_transclusions(page)
+                                                 for page in corpus])
+    regexes = timed("regexes", lambda: [scan_with_regexes(page) for page in corpus])
+
+    # A regex is wrong about a page if it doesn't find exactly the same spans
+    for key in sorted(REGEXES):
+        wrong = sum(1 for mine, theirs in zip(ours, regexes)
+                    if [span for span, _ in mine[key]] != theirs[key])
+        found = sum(len(mine[key]) for mine in ours)
+        print("  %-20s %5d found, regex wrong on %d pages" % (key, found, wrong))
+
+    try:
+        import mwparserfromhell # pylint: disable=unused-variable
+    except ImportError:
+        print("mwparserfromhell isn't installed; skipping it.")
+        return
+    parsed = timed("mwparserfromhell", lambda: [scan_with_mwparserfromhell(page)
+                                                for page in corpus])
+    differ = sum(1 for mine, theirs in zip(ours, parsed) for key in REGEXES
+                 if [params for _, params in mine[key]] != [params for _, params in theirs[key]])
+    print("%d (page, template) results differ from mwparserfromhell's." % differ)
+
+if __name__ == "__main__":
+    main()
@@ -1,115 +1,294 @@
-import codecs
-from numbers import Number
-import pywikibot
+"""
+Counts how the parameters of a template are used: for each parameter, how
+many transclusions fill it in, how many leave it empty, and its most common
+values. Pages come from the API (everything in the main namespace that
+transcludes the template) or from an XML dump.
+"""
+import argparse
+import bz2
+import collections
+import io
+import json
+import multiprocessing
+import os.path
 import re
 import sys
+import time
+from xml.etree import cElementTree as ElementTree
 
-#from clint.textui import progress
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+from scanstore import ScanStore
+from transclusions import find_transclusions, normalize_name
+
+# Pywikibot imported in main() and query() so dumps can be scanned without it
 
-TEMPLATE_NAME = "Template:Infobox Fraternity"
-TEMPLATE_REGEX = r"\{\{Infobox(\s|_)Fraternity(\{\{.+\}\}|[\s\S])+?\}\}"
-TEMPLATE_PATTERN = re.compile(TEMPLATE_REGEX, flags=re.IGNORECASE)
-TEMPLATE_SUB = re.compile(r"\{\{.+?\}\}")
-LINK_SUB = re.compile(r"\[\[(?P<target>.+?)\|(?P<text>.+?)\]\]")
-REF_SUB = re.compile(r"<ref[\s\S]+?</ref>")
-#EQUALS_SIGN_STRIP = re.compile(r"\s*=\s*")
-PARAM_SPLIT = re.compile(r"\s*([\s\S]*?)\s*=\s*([\s\S]*)\s*")
 DUNNO = "{{dunno|(none)}}"
-TEMPLATE_TRANSCLUSIONS = 570
-
-#COUNT_AND_LIST = ("origin_coordinates", "location", "length_km", "length_mi", "elevation_m", "elevation_ft", "mouth_elevation_m", "mouth_elevation_ft", "discharge_m3/s", "discharge_cuft/s", "watershed_km2", "watershed_sqmi", "etymology", "river_system", "native_name_lang")
-
-site = pywikibot.Site("en", "wikipedia")
-site.login()
-
-template = pywikibot.Page(site, TEMPLATE_NAME)
-
-#param_usage = {}
-#param_empty_usage = {}
-#types = []
-#pages = {}
-pages_by_type = {}
-
-references = template.getReferences(onlyTemplateInclusion=True,
-                                    namespaces=(0))
-#progress = progress.bar(references, expected_size=TEMPLATE_TRANSCLUSIONS)
-
-#i = 0
-
-for each_page in references: #progress:
-    #if i > 10: break
-    each_title = each_page.title(withNamespace=True)
-    each_text = each_page.get()
-    match = TEMPLATE_PATTERN.search(each_text)
-    if not match:
-        print(each_title)
-        print("^ NO MATCH FOUND!")
-    transclusion = match.group(0)[2:-2]
-    transclusion = TEMPLATE_SUB.sub("!t!", transclusion)
-    transclusion = LINK_SUB.sub(r"[[\1!\2]]", transclusion)
-    transclusion = REF_SUB.sub("!r!", transclusion)
-    for param in transclusion.split("|")[1:]:
-        try:
-            _, param_name, param_value, _ = PARAM_SPLIT.split(param)
-        except:
-            pass
-
-        if param_name.lower() != "type":
-            continue
-
-        pages_by_type[param_value] = pages_by_type.get(param_value, []) + [each_title]
-        #pages[each_title] = param_value
-        #dictionary = param_usage if param_value else param_empty_usage
-        #dictionary[param_name] = dictionary.get(param_name, []) + [each_title]
-
-    #i += 1
-
-#print("\n".join([x + ": " + y for x, y in pages.items()]))
-#sys.exit(0)
-for param_value, page_titles in pages_by_type.items():
-    fixed_param_value = param_value.strip()
-    print("* " + re.sub(r"!(.)", r"|\1", fixed_param_value) +
-            " (" + " ".join("[[{}|{}]]".format(item, index + 1)
-                for index, item in enumerate(page_titles)) + ")")
-sys.exit(0)
-
-##############################################################################
-
-types = [x.strip().encode("utf-8", "replace") for x in types]
-frequencies = {}
-for each_type in set(types):
-    frequencies[each_type] = types.count(each_type)
-print("\n".join([x + ("" if (i == 1) else (" (" + str(i) + "x)")) for x, i in frequencies.items()]))
-sys.exit(0)
-
-for dictionary in (param_usage, param_empty_usage):
-    for param, titles in dictionary.items():
-        if param not in COUNT_AND_LIST:
-            dictionary[param] = len(titles)
-
-def cell(dictionary, param):
-    if param in dictionary:
-        s = dictionary[param]
-        if isinstance(s, Number):
-            return "{} usage{}".format(s, "" if s == 1 else "s")
-        else:
-            if len(s) == 1:
-                return "[[" + s[0] + "]]"
+STORE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "parameter-scan.sqlite")
+
+# Pages per API request, and pages scanned between saves to the store
+BATCH_SIZE = 50
+STORE_EVERY = 100
+
+def get_parsed_args():
+    """Parse and return args."""
+    parser = argparse.ArgumentParser(prog="parameter-scan")
+    parser.add_argument("template", help="The template to scan for, e.g. \"Infobox person\".")
+    parser.add_argument("-a", "--alias", action="append", dest="aliases",
+                        help="Another name for the template, e.g. a redirect (can be given "
+                        "more than once). Redirects are looked up when using the API.")
+    parser.add_argument("-p", "--param", action="append", dest="params",
+                        help="Only count this parameter (can be given more than once). "
+                        "By default, every parameter is counted.")
+    parser.add_argument("-d", "--dump", type=str,
+                        help="Read pages from this XML dump (.xml or .xml.bz2) instead of the API.")
+    parser.add_argument("-j", "--jobs", type=int, default=multiprocessing.cpu_count(),
+                        help="Number of processes to parse pages in.")
+    parser.add_argument("-f", "--format", choices=("wikitable", "json"), default="wikitable",
+                        help="How to write the results.")
+    parser.add_argument("-n", "--values", type=int, default=10,
+                        help="How many of each parameter's most common values to list.")
+    parser.add_argument("-o", "--output", type=str,
+                        help="Write the results to this file instead of standard output.")
+    parser.add_argument("-s", "--store", type=str, default=STORE,
+                        help="The database of pages scanned so far, so that unchanged "
+                        "pages (and pages finished before a crash) aren't scanned again.")
+    parser.add_argument("--rescan", action="store_true",
+                        help="Scan every page again, even if it hasn't changed.")
+    return parser.parse_args()
+
+def query(site, params):
+    """Yields every response to a query, following continuations."""
+    from pywikibot.data.api import Request
+
+    continuation = {}
+    while True:
+        response = Request(site=site, **dict(params, action="query", formatversion=2,
+                                             **continuation)).submit()
+        yield response
+        if u"continue" not in response:
+            return
+        continuation = response[u"continue"]
+
+def list_transcluding_pages(site, template):
+    """Returns a dict from the pageid of each article transcluding the template to its latest revid."""
+    revisions = {}
+    for response in query(site, {"generator": "embeddedin", "geititle": "Template:" + template,
+                                 "geinamespace": 0, "geilimit": "max", "prop": "info"}):
+        for page in response.get(u"query", {}).get(u"pages", []):
+            revisions[page[u"pageid"]] = page[u"lastrevid"]
+    return revisions
+
+def fetch_pages(site, pageids):
+    """Yields (pageid, revid, title, wikitext) for each of the pages, 50 at a time."""
+    for start in range(0, len(pageids), BATCH_SIZE):
+        batch = pageids[start:start + BATCH_SIZE]
+        for response in query(site, {"pageids": "|".join(str(pageid) for pageid in batch),
+                                     "prop": "revisions", "rvprop": "ids|content",
+                                     "rvslots": "main"}):
+            for page in response.get(u"query", {}).get(u"pages", []):
+                if page.get(u"revisions"):
+                    revision = page[u"revisions"][0]
+                    yield (page[u"pageid"], revision[u"revid"], page[u"title"],
+                           revision[u"slots"][u"main"][u"content"])
+
+def read_dump(path):
+    """
+    Yields (pageid, revid, title, wikitext) for each article in an XML dump
+    (.xml or .xml.bz2).
+    """
+    dump_file = bz2.BZ2File(path) if path.endswith(".bz2") else open(path, "rb")
+    with dump_file:
+        page = {}
+        for _, element in ElementTree.iterparse(dump_file):
+            tag = element.tag.rpartition("}")[2]
+            if tag in ("title", "ns", "text"):
+                page[tag] = element.text or u""
+            elif tag == "id":
+                # The page's id comes first, then its revision's, then
+                # (maybe) the revision author's
+                if "pageid" not in page:
+                    page["pageid"] = int(element.text)
+                elif "revid" not in page:
+                    page["revid"] = int(element.text)
+            elif tag == "redirect":
+                page["redirect"] = True
+            elif tag == "page":
+                if page.get("ns") == "0" and not page.get("redirect"):
+                    yield page["pageid"], page.get("revid"), page["title"], page.get("text", u"")
+                page = {}
+                element.clear()
+
+def template_redirects(site, template):
+    """Returns the names of the templates that redirect to the template."""
+    return [page[u"title"].partition(u":")[2]
+            for response in query(site, {"list": "backlinks", "bltitle": "Template:" + template,
+                                         "blfilterredir": "redirects", "blnamespace": 10,
+                                         "bllimit": "max"})
+            for page in response.get(u"query", {}).get(u"backlinks", [])]
+
+def mentions(names):
+    """A regex that finds anything that might be a transclusion of one of the templates."""
+    alternatives = [r"[ _]+".join(re.escape(word) for word in normalize_name(name).split(" "))
+                    for name in names]
+    return re.compile(r"\{\{\s*(?:template\s*:\s*)?(?:" + "|".join(alternatives) + ")",
+                      re.IGNORECASE)
+
+def set_up_worker(names):
+    """Tells a worker which templates to look for."""
+    global TEMPLATE_NAMES
+    TEMPLATE_NAMES = names
+
+def scan_page(page_tuple):
+    """
+    Returns (pageid, revid, title, [params of each transclusion of the
+    template on the page]).
+    """
+    pageid, revid, title, wikitext = page_tuple
+    return pageid, revid, title, [transclusion.params for transclusion in
+                                  find_transclusions(wikitext, TEMPLATE_NAMES)]
+
+class ParameterCounts(object):
+    """Running totals of how each parameter is used."""
+    def __init__(self, only_params=None):
+        self.only_params = set(only_params) if only_params else None
+        self.pages = 0
+        self.transclusions = 0
+        self.filled = collections.Counter()
+        self.empty = collections.Counter()
+        self.values = collections.defaultdict(collections.Counter)
+
+    def add(self, params):
+        self.transclusions += 1
+        for name, value in params.items():
+            if self.only_params is not None and name not in self.only_params:
+                continue
+            value = value.strip()
+            if value:
+                self.filled[name] += 1
+                self.values[name][value] += 1
             else:
-                usages = "{} usages: ".format(len(s))
-                return usages + ", ".join(["[[" + x + "]]" for x in s])
+                self.empty[name] += 1
+
+    def parameters(self):
+        """The parameters to report on, in order."""
+        if self.only_params is not None:
+            return sorted(self.only_params)
+        return sorted(set(self.filled) | set(self.empty))
+
+    def to_json(self, template, top_values):
+        return {"template": template, "pages": self.pages,
+                "transclusions": self.transclusions,
+                "parameters": dict((name, {"filled": self.filled[name],
+                                           "empty": self.empty[name],
+                                           "values": self.values[name].most_common(top_values)})
+                                   for name in self.parameters())}
+
+    def to_wikitable(self, top_values):
+        result = u"{} transclusions on {} pages.\n".format(self.transclusions, self.pages)
+        result += u'{| class="wikitable sortable"\n! Parameter !! Filled !! Empty !! Absent !! Most common values\n'
+        for name in self.parameters():
+            filled, empty = self.filled[name], self.empty[name]
+            values = u", ".join(u"<nowiki>{}</nowiki> ({})".format(value.replace(u"\n", u" "), count)
+                                for value, count in self.values[name].most_common(top_values))
+            result += u"|-\n| <nowiki>{}</nowiki> || {} || {} || {} || {}\n".format(
+                name, filled, empty, self.transclusions - filled - empty, values or DUNNO)
+        return result + u"|}"
+
+def main():
+    args = get_parsed_args()
+    store = ScanStore(args.store, normalize_name(args.template))
+    known = {} if args.rescan else store.revisions()
+
+    names = [args.template] + (args.aliases or [])
+    counts = {"scanned": 0, "unchanged": 0}
+    if args.dump:
+        pages = read_dump(args.dump)
     else:
-        return DUNNO
+        import pywikibot
+        site = pywikibot.Site("en", "wikipedia")
+        names += template_redirects(site, args.template)
+        current = list_transcluding_pages(site, args.template)
+        store.retain(current)
+        changed = sorted(pageid for pageid, revid in current.items()
+                         if known.get(pageid) != revid)
+        counts["unchanged"] = len(current) - len(changed)
+        pages = fetch_pages(site, changed)
+
+    mention = mentions(names)
 
-result = '{| class=\"wikitable\"\n'
-for param in (param_usage.keys() + param_empty_usage.keys()):
-    result += '!rowspan="2"|' + param + "\n"
-    result += "|" + cell(param_usage, param) + "\n"
-    result += "|-\n|" + cell(param_empty_usage, param) + "\n|-\n"
-result += "|}"
+    # Pages that haven't changed since they were last scanned are skipped,
+    # and pages that can't have the template on them never go to the workers.
+    # The pool reads candidates() on a thread of its own, so what it finds
+    # comes back to this one through a queue.
+    no_template = queue.Queue()
+    still_there = set()
+    def candidates():
+        for pageid, revid, title, text in pages:
+            if known.get(pageid) == revid:
+                counts["unchanged"] += 1
+                still_there.add(pageid)
+            elif mention.search(text):
+                still_there.add(pageid)
+                yield pageid, revid, title, text
+            elif pageid in known or not args.dump:
+                # It used to have the template, or the API says it has it
+                # (but not directly); either way, remember it has none
+                still_there.add(pageid)
+                no_template.put((pageid, revid, title, []))
 
-print(result)
+    def collect(finished):
+        """Adds whatever candidates() has put on the queue to finished."""
+        while True:
+            try:
+                finished.append(no_template.get_nowait())
+            except queue.Empty:
+                return finished
+
+    finished = []
+    start_time = time.time()
+    pool = multiprocessing.Pool(args.jobs, initializer=set_up_worker, initargs=(names,))
+    try:
+        for result in pool.imap_unordered(scan_page, candidates(), chunksize=16):
+            counts["scanned"] += 1
+            finished.append(result)
+            if len(collect(finished)) >= STORE_EVERY:
+                store.update(finished)
+                del finished[:]
+    finally:
+        pool.close()
+        pool.join()
+        store.update(collect(finished))
+    if args.dump:
+        store.retain(still_there)
+    sys.stderr.write("Scanned {scanned} pages ({unchanged} unchanged since last time) in {0:.1f} s.\n"
+                     .format(time.time() - start_time, **counts))
+
+    # The totals always come from everything in the store
+    totals = ParameterCounts(args.params)
+    for found in store.results():
+        if found:
+            totals.pages += 1
+            for params in found:
+                totals.add(params)
+    store.close()
+
+    if args.format == "json":
+        result = json.dumps(totals.to_json(args.template, args.values),
+                            ensure_ascii=False, indent=2, sort_keys=True)
+    else:
+        result = totals.to_wikitable(args.values)
+    if isinstance(result, bytes):
+        result = result.decode("utf-8")
+
+    if args.output:
+        with io.open(args.output, "w", encoding="utf-8") as result_file:
+            result_file.write(result + u"\n")
+    else:
+        print(result.encode("utf-8") if sys.version_info[0] < 3 else result)
 
-with open("result.txt", "w") as result_file:
-    result = str(result.encode("utf-8", "replace"))
-    result_file.write(result)
+if __name__ == "__main__":
+    main()
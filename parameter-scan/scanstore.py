@@ -0,0 +1,65 @@
+"""
+A persistent record of what was found on each page that a scan has looked
+at, kept in SQLite. Pages are skipped on later runs (or after a crash) as
+long as they haven't been edited, and the totals are always rebuilt from
+the records.
+"""
+import json
+import sqlite3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    template TEXT NOT NULL,
+    pageid INTEGER NOT NULL,
+    revid INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    transclusions TEXT NOT NULL,
+    PRIMARY KEY (template, pageid)
+);
+"""
+
+class ScanStore(object):
+    """
+    For one template: the revision of each page that was scanned, and the
+    parameters of each of that revision's transclusions of the template.
+    """
+
+    def __init__(self, path, template):
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(SCHEMA)
+        self.template = template
+
+    def close(self):
+        """Close the underlying database."""
+        self.connection.close()
+
+    def revisions(self):
+        """Returns a dict from pageid to the revid last scanned."""
+        return dict(self.connection.execute(
+            "SELECT pageid, revid FROM pages WHERE template = ?", (self.template,)))
+
+    def update(self, records):
+        """
+        Record the results of scanning some pages, each given as (pageid,
+        revid, title, list of the transclusions' parameter dicts).
+        """
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?)",
+                [(self.template, pageid, revid, title, json.dumps(transclusions))
+                 for pageid, revid, title, transclusions in records])
+
+    def retain(self, pageids):
+        """Forget every page that isn't in pageids (e.g. no longer transcluding)."""
+        pageids = set(pageids)
+        gone = [(self.template, pageid) for pageid in self.revisions()
+                if pageid not in pageids]
+        with self.connection:
+            self.connection.executemany(
+                "DELETE FROM pages WHERE template = ? AND pageid = ?", gone)
+
+    def results(self):
+        """Yields the list of transclusions stored for every page."""
+        for (transclusions,) in self.connection.execute(
+                "SELECT transclusions FROM pages WHERE template = ?", (self.template,)):
+            yield json.loads(transclusions)
@@ -0,0 +1,51 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from scanstore import ScanStore
+
+class TestScanStore(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "parameter-scan.sqlite")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_update_and_revisions(self):
+        store = ScanStore(self.path, "infobox fraternity")
+        self.assertEqual(store.revisions(), {})
+        store.update([(1, 10, u"A", [{u"name": u"Alpha"}]),
+                      (2, 20, u"B", [])])
+        store.update([(1, 11, u"A", [{u"name": u"Alpha"}, {u"1": u"x"}])])
+        self.assertEqual(store.revisions(), {1: 11, 2: 20})
+        self.assertEqual(sorted(store.results(), key=len),
+                         [[], [{u"name": u"Alpha"}, {u"1": u"x"}]])
+        store.close()
+
+        # Everything's still there when the store is opened again
+        store = ScanStore(self.path, "infobox fraternity")
+        self.assertEqual(store.revisions(), {1: 11, 2: 20})
+        store.close()
+
+    def test_retain(self):
+        store = ScanStore(self.path, "infobox fraternity")
+        store.update([(pageid, pageid * 10, u"P%d" % pageid, []) for pageid in range(5)])
+        store.retain([1, 3, 99])
+        self.assertEqual(store.revisions(), {1: 10, 3: 30})
+        store.close()
+
+    def test_templates_kept_apart(self):
+        first = ScanStore(self.path, "infobox fraternity")
+        second = ScanStore(self.path, "infobox person")
+        first.update([(1, 10, u"A", [{u"a": u"1"}])])
+        second.update([(1, 12, u"A", [{u"b": u"2"}])])
+        second.retain([])
+        self.assertEqual(first.revisions(), {1: 10})
+        self.assertEqual(second.revisions(), {})
+        first.close()
+        second.close()
+
+if __name__ == "__main__":
+    unittest.main()
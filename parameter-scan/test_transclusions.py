@@ -0,0 +1,61 @@
+import unittest
+
+from transclusions import find_transclusions, normalize_name, transclusions
+
+class TestTransclusions(unittest.TestCase):
+    def test_nesting(self):
+        wikitext = ("{{Infobox x\n| a = {{nowrap|b|c=d}} [[e|f]]\n| g = {{{1|}}}\n"
+                    "| positional \n|h=<!-- i | j = k -->\n}} {{cite|l=m}}")
+        self.assertEqual(list(transclusions(wikitext)), [
+            ("Infobox x", (0, 96), {"a": "{{nowrap|b|c=d}} [[e|f]]", "g": "{{{1|}}}",
+                                    "1": " positional \n", "h": ""}),
+            ("cite", (97, 109), {"l": "m"})])
+        self.assertEqual(wikitext[97:109], "{{cite|l=m}}")
+
+    def test_not_top_level(self):
+        wikitext = "[[File:x.jpg|{{a}}]] {{b|{{c}}}} {{d"
+        self.assertEqual([transclusion.name for transclusion in transclusions(wikitext)], ["b"])
+
+    def test_skipped_text(self):
+        wikitext = "<nowiki>{{a}}</nowiki> <!-- {{b}} --> <pre>{{c}}</pre> {{d}}"
+        self.assertEqual([transclusion.name for transclusion in transclusions(wikitext)], ["d"])
+
+    def test_unclosed_links(self):
+        names = lambda wikitext: [transclusion.name for transclusion in transclusions(wikitext)]
+        self.assertEqual(list(transclusions("Intro [[Foo\n\n{{Infobox x|a=1}}")),
+                         [("Infobox x", (13, 30), {"a": "1"})])
+        self.assertEqual(names("[[Foo|bar {{a}} [[File:x.jpg|{{b}}]] {{c}}"), ["a", "c"])
+
+        # A link's text can go over more than one line, but not its target
+        self.assertEqual(names("[[Foo|bar\n{{a}}]] {{b}} [[Foo {{c}}\n{{d}}"), ["b", "c", "d"])
+        self.assertEqual(names("{{a|[[b\n|c=1}} {{d}}"), ["a", "d"])
+
+        # Inside a template, an unclosed link's pipes are the template's
+        self.assertEqual(list(transclusions("{{a|b=[[c|d\n|e=f}}"))[0].params,
+                         {"b": "[[c", "1": "d\n", "e": "f"})
+        self.assertEqual(list(transclusions("{{a|[[b=c\n|d}}"))[0].params,
+                         {"[[b": "c", "1": "d"})
+
+    def test_unclosed_braces(self):
+        self.assertEqual([transclusion.name for transclusion in
+                          transclusions("{{a {{b|c=1}} {{{d {{e}} {{}}")], ["b", "e"])
+
+    def test_skipped_tags(self):
+        self.assertEqual(list(transclusions("{{Infobox x|a=<math>{{b</math>|c=1}}")),
+                         [("Infobox x", (0, 36), {"a": "<math>{{b</math>", "c": "1"})])
+        wikitext = ("<code>{{a}}</code> <syntaxhighlight lang=\"text\">{{b|</syntaxhighlight> "
+                    "<source>}}</source> {{c|<code>|</code>=1}}")
+        self.assertEqual(list(transclusions(wikitext)), [("c", (91, 113), {"<code>|</code>": "1"})])
+
+    def test_aliases(self):
+        wikitext = "{{Infobox Person|a=1}} {{template:infobox_person}} {{Infobox human}} {{Infobox}}"
+        self.assertEqual([name for name, _, _ in
+                          find_transclusions(wikitext, ["Infobox person", "Infobox human"])],
+                         ["Infobox Person", "template:infobox_person", "Infobox human"])
+
+    def test_normalize_name(self):
+        self.assertEqual(normalize_name(" Template:Infobox_person<!-- x -->\n"),
+                         "infobox person")
+
+if __name__ == "__main__":
+    unittest.main()
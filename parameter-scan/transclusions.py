@@ -0,0 +1,216 @@
+"""
+Finds template transclusions in wikitext, usually in a single pass over it.
+
+Templates ({{...}}), template parameters ({{{...}}}) and links ([[...]])
+are tracked on a stack as the text is read, so the pipes and equals signs
+that separate a template's parameters are only split on at the template's
+own level; nested templates and piped links stay whole. Comments and
+the bodies of tags like nowiki, pre and math are skipped. Unclosed braces
+and links are plain text, as on the wiki, so the templates after (and
+inside) them still count.
+
+Template names are matched the way the wiki does, ignoring case (and any
+"Template:" and underscores), against a set of aliases so that transclusions
+through redirects are found too.
+"""
+from collections import namedtuple
+import re
+
+# Tags whose bodies can't hold a transclusion (or at least not a top-level one)
+SKIPPED_TAGS = ("nowiki", "pre", "math", "syntaxhighlight", "source", "code")
+
+INTERESTING = re.compile(r"\{{2,}|\}{2,}|\[\[|\]\]|[|=\n]|<!--|<(?P<tag>" +
+                         "|".join(SKIPPED_TAGS) + r")\b[^>]*>", re.IGNORECASE)
+CLOSING_TAG = dict((tag, re.compile(r"</" + tag + r"\s*>", re.IGNORECASE))
+                   for tag in SKIPPED_TAGS)
+COMMENT = re.compile(r"<!--.*?(?:-->|\Z)", re.DOTALL)
+TEMPLATE_NAMESPACE = re.compile(r"^\s*template\s*:", re.IGNORECASE)
+
+TEMPLATE, PARAMETER, LINK = "template", "parameter", "link"
+
+# name is as written (minus comments and surrounding whitespace); span is the
+# (start, end) of the whole transclusion, braces included
+Transclusion = namedtuple("Transclusion", "name span params")
+
+def normalize_name(name):
+    """
+    The lowercase name of a template as it might be written in a
+    transclusion, minus any "Template:" and with spaces for underscores.
+    """
+    name = TEMPLATE_NAMESPACE.sub("", COMMENT.sub("", name))
+    return " ".join(name.replace("_", " ").split()).lower()
+
+class Frame(object):
+    """Something on the stack: where it started, and for templates, its pipes."""
+    __slots__ = ("kind", "start", "pipes", "equals", "pending")
+
+    def __init__(self, kind, start):
+        self.kind = kind
+        self.start = start
+
+        # Offsets of the template's own pipes, and of the first equals sign
+        # after each one (or None), for splitting it into parameters. Links
+        # keep theirs too, in case they turn out to be text inside a
+        # template; theirs start with the first equals sign before any pipe.
+        self.pipes = []
+        self.equals = [None] if kind == LINK else []
+
+        # For links: the templates closed inside it that are top-level
+        # after all if it turns out not to be a link
+        self.pending = []
+
+def split_parameters(wikitext, frame, end):
+    """Returns the Transclusion for a template closed at end."""
+    inside = frame.start + 2
+    boundaries = [inside] + [pipe + 1 for pipe in frame.pipes]
+    ends = frame.pipes + [end]
+    name = COMMENT.sub("", wikitext[inside:ends[0]]).strip()
+
+    params = {}
+    position = 1
+    for part_start, part_end, equals in zip(boundaries[1:], ends[1:], frame.equals):
+        if equals is None:
+            params[str(position)] = COMMENT.sub("", wikitext[part_start:part_end])
+            position += 1
+        else:
+            key = COMMENT.sub("", wikitext[part_start:equals]).strip()
+            params[key] = COMMENT.sub("", wikitext[equals + 1:part_end]).strip()
+    return Transclusion(name, (frame.start, end + 2), params)
+
+def find_transclusions(wikitext, names):
+    """
+    Yields a Transclusion for each top-level transclusion of any of the
+    templates named (e.g. a template and its redirects), in order.
+    """
+    names = set(normalize_name(name) for name in names)
+    return (transclusion for transclusion in transclusions(wikitext)
+            if normalize_name(transclusion.name) in names)
+
+def merge_link(link, frame):
+    """
+    Gives a link that turned out to be text the frame it's in's pipes and
+    equals signs, so they split the frame's parameters instead.
+    """
+    if frame.kind == PARAMETER:
+        return
+    if frame.equals and frame.equals[-1] is None:
+        frame.equals[-1] = link.equals[0]
+    frame.pipes.extend(link.pipes)
+    frame.equals.extend(link.equals[1:])
+
+def drop_links(stack, keep):
+    """
+    Takes the links that keep(frame) is false for off the stack, and returns
+    the templates that were waiting on links, if they're now top-level.
+    """
+    # Only links with nothing but links under them have templates waiting
+    released = []
+    kept = []
+    for frame in stack:
+        if frame.kind == LINK:
+            released.extend(frame.pending)
+            frame.pending = []
+            if not keep(frame):
+                if kept:
+                    merge_link(frame, kept[-1])
+                continue
+        kept.append(frame)
+    stack[:] = kept
+    if stack and stack[0].kind == LINK:
+        stack[0].pending = released
+        return []
+    return released
+
+def transclusions(wikitext):
+    """
+    Yields a Transclusion for each template transcluded at the top level of
+    the wikitext (not inside another template or a link), in order. Named
+    parameters are stripped of surrounding whitespace; positional ones,
+    keyed "1", "2"..., aren't, as on the wiki.
+    """
+    stack = []
+    position = 0
+    while True:
+        match = INTERESTING.search(wikitext, position)
+        if not match:
+            braces = [index for index, frame in enumerate(stack) if frame.kind != LINK]
+            if braces:
+                # The outermost unclosed braces were just text; start again
+                # after them, with only the links opened before them
+                frame = stack[braces[0]]
+                del stack[braces[0]:]
+                position = frame.start + (3 if frame.kind == PARAMETER else 2)
+                continue
+
+            # Whatever links are still open were just text too
+            for transclusion in drop_links(stack, lambda frame: False):
+                yield transclusion
+            return
+        token = match.group(0)
+        position = match.end()
+
+        if token[0] == "{":
+            run = len(token)
+            while run >= 2:
+                kind = PARAMETER if run == 3 else TEMPLATE
+                width = 3 if kind == PARAMETER else 2
+                stack.append(Frame(kind, match.end() - run))
+                run -= width
+
+        elif token[0] == "}":
+            run, closed_at = len(token), match.start()
+            while run >= 2 and stack:
+                top = stack[-1]
+                if top.kind == PARAMETER and run >= 3:
+                    stack.pop()
+                    run -= 3
+                    closed_at += 3
+                elif top.kind == TEMPLATE:
+                    stack.pop()
+                    transclusion = split_parameters(wikitext, top, closed_at)
+                    if not transclusion.name:
+                        pass # "{{}}" is just text
+                    elif not stack:
+                        yield transclusion
+                    elif all(frame.kind == LINK for frame in stack):
+                        # Top-level unless the link turns out to be one
+                        stack[-1].pending.append(transclusion)
+                    run -= 2
+                    closed_at += 2
+                elif top.kind == LINK and any(frame.kind != LINK for frame in stack):
+                    # An unclosed link inside a template was just text
+                    stack.pop()
+                    merge_link(top, stack[-1])
+                else:
+                    break
+
+        elif token == "[[":
+            stack.append(Frame(LINK, match.start()))
+
+        elif token == "]]":
+            if stack and stack[-1].kind == LINK:
+                stack.pop()
+
+        elif token == "|":
+            if stack and stack[-1].kind in (TEMPLATE, LINK):
+                stack[-1].pipes.append(match.start())
+                stack[-1].equals.append(None)
+
+        elif token == "=":
+            top = stack[-1] if stack else None
+            if top and top.kind != PARAMETER and top.equals and top.equals[-1] is None:
+                top.equals[-1] = match.start()
+
+        elif token == "\n":
+            # A link's target can't go over more than one line (its text can)
+            if any(frame.kind == LINK and not frame.pipes for frame in stack):
+                for transclusion in drop_links(stack, lambda frame: frame.pipes):
+                    yield transclusion
+
+        elif token == "<!--":
+            end = wikitext.find("-->", position)
+            position = len(wikitext) if end == -1 else end + 3
+
+        elif not token.endswith("/>"):
+            closing = CLOSING_TAG[match.group("tag").lower()].search(wikitext, position)
+            position = len(wikitext) if not closing else closing.end()
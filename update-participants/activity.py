@@ -0,0 +1,91 @@
+"""
+Works out which users are active, for lots of users at once.
+
+Accounts are first looked up MAX_USERS at a time with list=users, which
+settles the ones that don't exist or have never edited. Everyone else
+needs a list=usercontribs query of their own (its limit is shared by all
+the users in a request), so those run a few at a time in a thread pool.
+
+ActivityResolver is given the function to send requests with rather than
+a site, so the tests can answer them from a dict.
+"""
+import datetime
+from multiprocessing.pool import ThreadPool
+import threading
+import time
+
+# list=users accepts 500 names from bots but only 50 from everyone else
+MAX_USERS = 50
+
+DEFAULT_TTL = 24 * 60 * 60
+
+def normalize_username(username):
+    """The name the wiki will call a user by (first letter capitalized)."""
+    username = u" ".join(username.replace(u"_", u" ").split())
+    return username[:1].upper() + username[1:]
+
+class ActivityResolver(object):
+    """
+    Answers "has this user edited since the cutoff?" for many users at
+    once, remembering each answer for ttl seconds.
+    """
+    def __init__(self, api, cutoff, workers=4, ttl=DEFAULT_TTL):
+        """cutoff is a date; a user is active if they edited after that day."""
+        self.api = api
+        self.cutoff = cutoff
+        self.workers = workers
+        self.ttl = ttl
+
+        # username -> (active, when we found out)
+        self.cache = {}
+        self.lock = threading.Lock()
+
+    def is_fresh(self, username):
+        return (username in self.cache and
+                time.time() - self.cache[username][1] < self.ttl)
+
+    def remember(self, username, active):
+        with self.lock:
+            self.cache[username] = (active, time.time())
+
+    def resolve(self, usernames):
+        """Returns a dict from each of the usernames to whether they're active."""
+        names = dict((username, normalize_username(username)) for username in usernames)
+        unknown = sorted(set(name for name in names.values() if not self.is_fresh(name)))
+
+        # Accounts that don't exist or have no edits can't be active
+        need_contribs = []
+        for start in range(0, len(unknown), MAX_USERS):
+            batch = unknown[start:start + MAX_USERS]
+            response = self.api({"action": "query", "formatversion": 2,
+                                 "list": "users", "ususers": u"|".join(batch),
+                                 "usprop": "editcount"})
+            users = dict((user[u"name"], user) for user in
+                         response.get(u"query", {}).get(u"users", []))
+            for name in batch:
+                user = users.get(name, {})
+                if user.get(u"missing") or user.get(u"editcount", 1) == 0:
+                    self.remember(name, False)
+                else:
+                    # Includes IPs and anything the API didn't recognize
+                    need_contribs.append(name)
+
+        if need_contribs:
+            pool = ThreadPool(max(1, min(self.workers, len(need_contribs))))
+            try:
+                for name, active in pool.imap_unordered(self.edited_since_cutoff,
+                                                        need_contribs):
+                    self.remember(name, active)
+            finally:
+                pool.close()
+                pool.join()
+
+        return dict((username, self.cache[name][0]) for username, name in names.items())
+
+    def edited_since_cutoff(self, name):
+        """Returns (name, whether they've edited after the cutoff day)."""
+        end = (self.cutoff + datetime.timedelta(days=1)).strftime("%Y-%m-%dT00:00:00Z")
+        response = self.api({"action": "query", "formatversion": 2,
+                             "list": "usercontribs", "ucuser": name,
+                             "ucend": end, "uclimit": 1, "ucprop": "timestamp"})
+        return name, bool(response.get(u"query", {}).get(u"usercontribs"))
@@ -0,0 +1,109 @@
+"""
+Reads the participants list on a WikiProject page in a single pass over its
+lines. Each heading and each line naming a user is recorded with where it
+starts and ends, and each user line notes the subsection it's in. The list
+can then be rebuilt and spliced back into the page by offset.
+"""
+from collections import namedtuple
+import re
+
+#USER_TEMPLATE = re.compile(r"{{.*?[Uu]ser.*?\|(.+?)(?:\|.*?)?}}", re.UNICODE)
+USER_LINK = re.compile(r"\[\[[Uu]ser.*?:(.+?)(?:/.*)?(?:\|.*?)?\]\]", re.UNICODE)
+HEADING = re.compile(r"^(=+)(.+?)(=+)\s*$", re.UNICODE)
+LIST_ITEM = re.compile(r"(\*|#).+", re.UNICODE)
+PARTICIPANTS = ("Participants", "Members")
+
+Heading = namedtuple("Heading", "level title start end")
+
+# subsection is the lowercased title of the level-3 (or deeper) heading the
+# line comes after, or None if it isn't in one
+Entry = namedtuple("Entry", "username line start end subsection")
+
+def line_to_username(line):
+    """Given a line of wikitext, extract a username."""
+    #user_template_match = USER_TEMPLATE.search(line)
+    #if user_template_match:
+    #    return user_template_match.group(1)
+
+    user_link_match = USER_LINK.search(line)
+    if user_link_match:
+        return user_link_match.group(1)
+
+    return None
+
+def tokenize(wikitext, start=0, end=None):
+    """
+    Returns a list of the Headings and a list of the user Entries in the
+    wikitext between start and end (offsets are into the whole wikitext).
+    """
+    end = len(wikitext) if end is None else end
+    headings, entries = [], []
+    subsection = None
+    line_start = start
+    while line_start < end:
+        line_end = wikitext.find("\n", line_start, end)
+        if line_end == -1:
+            line_end = end
+        line = wikitext[line_start:line_end]
+
+        heading = HEADING.match(line)
+        if heading:
+            level = min(len(heading.group(1)), len(heading.group(3)))
+            title = heading.group(2).strip()
+            headings.append(Heading(level, title, line_start, line_end))
+            subsection = title.lower() if level > 2 else None
+        else:
+            username = line_to_username(line)
+            if username:
+                entries.append(Entry(username, line, line_start, line_end, subsection))
+
+        line_start = line_end + 1
+    return headings, entries
+
+def get_participants_section(wikitext, headings):
+    """
+    Returns the (start, end) of the one level-2 section titled like a
+    participants section, or None (saying why) if there isn't exactly one
+    or it has subsections that aren't about (in)active participants.
+    """
+    sections = [index for index, heading in enumerate(headings)
+                if heading.level == 2 and heading.title in PARTICIPANTS]
+    if not sections:
+        return None
+    if len(sections) > 1:
+        print("Error! Multiple participants sections found.")
+        return None
+
+    print("Found a section with a participants list. Parsing...")
+    index = sections[0]
+    start, end = headings[index].start, len(wikitext)
+    for heading in headings[index + 1:]:
+        if heading.level <= 2:
+            end = heading.start
+            break
+
+        # Verify that the structure of this section is simple
+        if "active" not in heading.title.lower():
+            print("Error! Participants list structure is too complicated (found title: {})".format(heading.title.lower().encode("utf-8")))
+            return None
+    return start, end
+
+def count_moves(entries, is_active):
+    """
+    How many of the entries are on the wrong list for their activity. Users
+    not under any subsection count as being on the active list.
+    """
+    return sum(1 for entry in entries
+               if ("inactive" in (entry.subsection or "")) == is_active[entry.username])
+
+def splice_list(wikitext, entries, is_active, template):
+    """
+    Replaces the lines from the first entry to the last with the template,
+    filled in with the lines of the active and then the inactive users.
+    """
+    activity_lists = {True: [], False: []}
+    for entry in entries:
+        activity_lists[is_active[entry.username]].append(entry.line)
+    new_participants_list = template.format(u"\n".join(activity_lists[True]),
+                                            u"\n".join(activity_lists[False]))
+    return wikitext[:entries[0].start] + new_participants_list + wikitext[entries[-1].end:]
@@ -0,0 +1,78 @@
+import datetime
+import threading
+import unittest
+
+from activity import ActivityResolver, normalize_username
+
+CUTOFF = datetime.date(2020, 1, 1)
+
+class FakeApi(object):
+    """
+    Answers list=users and list=usercontribs requests out of a dict of
+    username -> timestamp of their last edit (None for no edits), the way
+    the API would with formatversion=2. Counts the requests of each kind.
+    """
+    def __init__(self, last_edits):
+        self.last_edits = last_edits
+        self.requests = {"users": 0, "usercontribs": 0}
+        self.lock = threading.Lock()
+
+    def __call__(self, params):
+        with self.lock:
+            self.requests[params["list"]] += 1
+        if params["list"] == "users":
+            users = []
+            for name in params["ususers"].split("|"):
+                if name not in self.last_edits:
+                    users.append({"name": name, "missing": True})
+                else:
+                    users.append({"name": name, "editcount":
+                                  0 if self.last_edits[name] is None else 10})
+            return {"query": {"users": users}}
+
+        assert params["uclimit"] == 1
+        last_edit = self.last_edits.get(params["ucuser"])
+        contribs = ([{"timestamp": last_edit}]
+                    if last_edit and last_edit >= params["ucend"] else [])
+        return {"query": {"usercontribs": contribs}}
+
+class TestActivityResolver(unittest.TestCase):
+    def setUp(self):
+        self.last_edits = {"Active %d" % i: "2020-03-01T12:00:00Z" for i in range(80)}
+        self.last_edits.update({"Inactive %d" % i: "2019-06-01T12:00:00Z" for i in range(40)})
+        self.last_edits.update({"Never edited": None,
+                                "Cutoff day": "2020-01-01T23:59:59Z",
+                                "Day after": "2020-01-02T00:00:00Z"})
+        self.api = FakeApi(self.last_edits)
+        self.resolver = ActivityResolver(self.api, CUTOFF)
+
+    def test_resolve(self):
+        usernames = list(self.last_edits) + ["Nobody", "active_1"]
+        result = self.resolver.resolve(usernames)
+        self.assertEqual(sorted(name for name in result if result[name]),
+                         sorted(["Active %d" % i for i in range(80)] +
+                                ["Day after", "active_1"]))
+
+        # 124 distinct accounts, 50 at a time; then one contribs lookup for
+        # each account that exists and has edits
+        self.assertEqual(self.api.requests, {"users": 3, "usercontribs": 122})
+
+    def test_cache(self):
+        self.resolver.resolve(["Active 1", "Inactive 1", "Nobody"])
+        self.assertEqual(self.api.requests, {"users": 1, "usercontribs": 2})
+        result = self.resolver.resolve(["Active 1", "Inactive_1", "Active 2"])
+        self.assertEqual(result, {"Active 1": True, "Inactive_1": False,
+                                  "Active 2": True})
+        self.assertEqual(self.api.requests, {"users": 2, "usercontribs": 3})
+
+    def test_expiry(self):
+        self.resolver.ttl = 0
+        self.resolver.resolve(["Active 1"])
+        self.resolver.resolve(["Active 1"])
+        self.assertEqual(self.api.requests, {"users": 2, "usercontribs": 2})
+
+    def test_normalize_username(self):
+        self.assertEqual(normalize_username(u"foo_bar  baz "), u"Foo bar baz")
+
+if __name__ == "__main__":
+    unittest.main()
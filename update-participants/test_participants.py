@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from participants import count_moves, get_participants_section, splice_list, tokenize
+
+TEMPLATE = u"{}\n===Inactive===\n{}"
+
+PAGE = u"""Intro mentioning [[User:Owner]].
+== Participants ==
+* [[User:Alice|Alice]]
+* [[User talk:Bob]]
+=== Inactive participants ===
+* [[User:Carol/sig|Carol]]
+* [[User:Alice|Alice]]
+== Other ==
+* [[User:Dave]]"""
+
+class TestTokenize(unittest.TestCase):
+    def test_offsets_and_subsections(self):
+        headings, entries = tokenize(PAGE)
+        self.assertEqual([(heading.level, heading.title) for heading in headings],
+                         [(2, u"Participants"), (3, u"Inactive participants"), (2, u"Other")])
+        self.assertEqual([(entry.username, entry.subsection) for entry in entries],
+                         [(u"Owner", None), (u"Alice", None), (u"Bob", None),
+                          (u"Carol", u"inactive participants"),
+                          (u"Alice", u"inactive participants"), (u"Dave", None)])
+        for entry in entries:
+            self.assertEqual(PAGE[entry.start:entry.end], entry.line)
+
+    def test_section(self):
+        headings, entries = tokenize(PAGE)
+        start, end = get_participants_section(PAGE, headings)
+        self.assertTrue(PAGE[start:end].startswith(u"== Participants =="))
+        self.assertTrue(PAGE[start:end].endswith(u"* [[User:Alice|Alice]]\n"))
+
+    def test_complicated_section(self):
+        page = PAGE.replace(u"Inactive participants", u"Task forces")
+        self.assertIsNone(get_participants_section(page, tokenize(page)[0]))
+
+    def test_count_moves(self):
+        headings, entries = tokenize(PAGE)
+        start, end = get_participants_section(PAGE, headings)
+        entries = [entry for entry in entries if start <= entry.start < end]
+
+        # Bob is directly under the heading, which counts as the active list
+        self.assertEqual(count_moves(entries, {u"Alice": True, u"Bob": False,
+                                               u"Carol": False}), 2)
+        self.assertEqual(count_moves(entries, {u"Alice": False, u"Bob": True,
+                                               u"Carol": False}), 1)
+
+    def test_splice(self):
+        headings, entries = tokenize(PAGE)
+        start, end = get_participants_section(PAGE, headings)
+        entries = [entry for entry in entries if start <= entry.start < end]
+        is_active = {u"Alice": True, u"Bob": False, u"Carol": False}
+        new_page = splice_list(PAGE, entries, is_active, TEMPLATE)
+        self.assertEqual(new_page, u"""Intro mentioning [[User:Owner]].
+== Participants ==
+* [[User:Alice|Alice]]
+* [[User:Alice|Alice]]
+===Inactive===
+* [[User talk:Bob]]
+* [[User:Carol/sig|Carol]]
+== Other ==
+* [[User:Dave]]""")
+
+if __name__ == "__main__":
+    unittest.main()
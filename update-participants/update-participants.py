@@ -1,147 +1,179 @@
 import argparse
 import datetime
+import json
 import mwparserfromhell
-from operator import itemgetter
+from multiprocessing.pool import ThreadPool
+import os
 import pywikibot
 from pywikibot.data.api import Request
-import re
-import sys
 
-from clint.textui import progress
+from activity import ActivityResolver
+from participants import (LIST_ITEM, PARTICIPANTS, count_moves,
+                          get_participants_section, splice_list, tokenize)
 
-THREE_MONTHS_AGO = (datetime.datetime.today() - datetime.timedelta(60)).strftime("%Y-%m-%d")
-#USER_TEMPLATE = re.compile(ur"{{.*?[Uu]ser.*?\|(.+?)(?:\|.*?)?}}", re.UNICODE)
-USER_LINK = re.compile(ur"\[\[[Uu]ser.*?:(.+?)(?:/.*)?(?:\|.*?)?\]\]", re.UNICODE)
+THREE_MONTHS_AGO = (datetime.datetime.today() - datetime.timedelta(60)).date()
 TEMPLATE = u"{}\n===Inactive participants===\n''Generated by a [[User:APersonBot|bot]]''\n{}"
 SUMMARY = "[[Wikipedia:Bots/Requests for approval/APersonBot 9|Bot]] testing a bot"
-PARTICIPANTS = ("Participants", "Members")
-LIST_ITEM = re.compile(ur"(\*|#).+")
+CHECKPOINT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "checkpoint.json")
 
-def is_user_active(site, username):
-    """Tests if a given user is active."""
-    contributions = Request(site=site, action="query", list="usercontribs", ucuser=username, uclimit=1, ucprop="timestamp").submit()[u"query"][u"usercontribs"]
-    return bool(contributions) and contributions[0][u"timestamp"].partition("T")[0] > THREE_MONTHS_AGO
+# How many users to look up between checkpoint saves
+RESOLVE_CHUNK = 250
 
-def line_to_username(line):
-    """Given a line of wikitext, extract a username."""
-    #user_template_match = USER_TEMPLATE.search(line)
-    #if user_template_match:
-    #    return user_template_match.group(1)
+def make_api(site):
+    "Returns a function that submits a dict of API parameters to the wiki."
+    def submit(params):
+        "Submit one API request."
+        return Request(site=site, **params).submit()
+    return submit
 
-    user_link_match = USER_LINK.search(line)
-    if user_link_match:
-        return user_link_match.group(1)
-
-    return None
-
-first = itemgetter(0)
-def wikitext_to_usernames(wikitext):
-    """Given some wikitext, return a tuple of (username, line)'s."""
-    return filter(first, ((line_to_username(l), l) for l in wikitext.splitlines()))
-
-def update_participants_list(site, wikitext):
+def update_participants_list(resolver, wikitext, entries):
     """
-    Given a Pywikibot Site and some wikitext containing a participants list,
-    create an "Inactive participants" section and move users there as needed.
+    Given an ActivityResolver, some wikitext containing a participants list
+    and the list's entries (from participants.tokenize), create an "Inactive
+    participants" section and move users there as needed.
     """
-
-    # Obtain the region of wikitext that contains usernames
-    first_line = next(x for x in wikitext.splitlines() if line_to_username(x))
-    last_line = next(x for x in reversed(wikitext.splitlines()) if line_to_username(x))
-    old_participants_list = wikitext[wikitext.find(first_line):wikitext.find(last_line) + len(last_line)]
+    if not entries:
+        print("Error! I couldn't find any participants.")
+        return wikitext
 
     # If the page doesn't use a numbered or bulleted list, we really shouldn't parse it
-    if not LIST_ITEM.match(first_line):
+    if not LIST_ITEM.match(entries[0].line):
         print("Error! I can't recognize that list format.")
         return wikitext
 
-    activity_lists = {True: [], False: []}
-    for username, line in progress.bar(wikitext_to_usernames(wikitext)):
-        activity_lists[is_user_active(site, username)].append(line)
-    active_users = "\n".join(activity_lists[True])
-    inactive_users = "\n".join(activity_lists[False])
-
-    new_participants_list = TEMPLATE.format(unicode(active_users),
-                                            unicode(inactive_users))
-    return wikitext.replace(old_participants_list, new_participants_list)
+    print("Checking the activity of {} users...".format(len(entries)))
+    is_active = resolver.resolve(entry.username for entry in entries)
+    moved = count_moves(entries, is_active)
+    if moved:
+        print("{} users are moving between the active and inactive lists.".format(moved))
+    return splice_list(wikitext, entries, is_active, TEMPLATE)
 
 def locate_participants_list(page):
     """
-    Gets the text of a participants list in the given page. Also searches in
+    Finds the participants list in the given page. Also searches in
     specially-named pages transcluded in the given page. Returns a tuple of
-    the form (wikitext, page), where wikitext is the text of the list and page
-    is the pywikibot.Page where it came from.
+    the form (page, entries), where page is the pywikibot.Page the list is
+    on and entries are the list's participants.Entry's, or None.
     """
+    text = page.text
+    headings, entries = tokenize(text)
     if any(x in page.title(withNamespace=False) for x in PARTICIPANTS):
         print("Entire page is a participants list. Parsing...")
-        return (page.text, page)
-    else:
-        # Locate a "Participants" section and try to parse that.
-        wikicode = mwparserfromhell.parse(page.text)
-        sections = wikicode.get_sections(include_lead=False, levels=(2,))
-        is_participants_section = lambda s:get_section_title(s) in PARTICIPANTS
-        sections = filter(is_participants_section, sections)
-        if sections:
-            if len(sections) == 1:
-                print("Found a section with a participants list. Parsing...")
-                section = sections[0]
-                section_text = unicode(section)
-
-                # Verify that the structure of this section is simple
-                if "===" in section_text:
-                    subsections = section.get_sections(include_lead=False)
-                    subsection_titles = map(get_section_title, subsections)
-                    subsection_titles = subsection_titles[1:] # Forget the main title
-                    for subsection_title in subsection_titles:
-                        subsection_title = subsection_title.lower()
-                        if "active" not in subsection_title and "inactive" not in subsection_title:
-                            print("Error! Participants list structure is too complicated (found title: {})".format(subsection_title))
-                            break
-                    else:
-                        return (section_text, page)
-            else:
-                print("Error! Multiple participants sections found.")
-        else:
-            # Is there a participants subpage transclusion?
-            templates = wikicode.filter_templates()
-            is_participants_tpl = lambda t:any("/" + x in str(t.name) for x in PARTICIPANTS)
-            templates = filter(is_participants_tpl, templates)
-            if templates:
-                template = templates[0]
-                print("Found a template titled \"{}\". Parsing...".format(template.name))
-                template = pywikibot.Page(site, str(template.name))
-                return (template.text, template)
-
-def get_section_title(section):
-    """Given a mwparserfromhell Section, get the title."""
-    return section.filter_headings()[0].title.strip()
-
-def main():
-    site = pywikibot.Site("en", "wikipedia")
-    site.login()
-
-    parser = argparse.ArgumentParser()
-    parser.add_argument("page", help="The title (with namespace) of the page to process.")
-    args = parser.parse_args()
-
-    page = pywikibot.Page(site, args.page)
-    if not page.exists():
-        print("%s doesn't exist! Exiting." % args.page)
-        sys.exit(1)
-
-    list_text, page = locate_participants_list(page)
+        return (page, entries)
+
+    # Locate a "Participants" section and try to parse that.
+    if any(heading.level == 2 and heading.title in PARTICIPANTS for heading in headings):
+        section = get_participants_section(text, headings)
+        if section:
+            start, end = section
+            return (page, [entry for entry in entries if start <= entry.start < end])
+        return None
+
+    # Is there a participants subpage transclusion?
+    templates = mwparserfromhell.parse(text).filter_templates()
+    is_participants_tpl = lambda t:any("/" + x in str(t.name) for x in PARTICIPANTS)
+    templates = filter(is_participants_tpl, templates)
+    if templates:
+        template = templates[0]
+        print("Found a template titled \"{}\". Parsing...".format(template.name))
+        template = pywikibot.Page(page.site, str(template.name))
+        return (template, tokenize(template.text)[1])
+
+def write_sandbox(site, resolver, page, entries):
+    """
+    Moves inactive users out of the participants list on page (whose
+    entries are given) and saves the page's new text to a sandbox. Returns
+    whether anything changed.
+    """
     original_page_text = page.text
-    new_list_text = update_participants_list(site, list_text)
-    page.text = page.text.replace(list_text, new_list_text)
+    page.text = update_participants_list(resolver, original_page_text, entries)
 
     if original_page_text == page.text:
-        print("Nothing changed; exiting.")
-        sys.exit(0)
+        print("Nothing changed in {}.".format(page.title(withNamespace=True).encode("utf-8")))
+        return False
 
     sandbox_page = pywikibot.Page(site, "User:APersonBot/sandbox/Task 9/" + page.title(withNamespace=True))
     sandbox_page.text = "{{{{mbox|text=Results of [https://github.com/APerson241/APersonBot/blob/master/update-participants/update-participants.py update-participants] for [[{}]], run at {}. (Edit, remove the surrounding <nowiki>'s, and preview to see the list as it would normally appear.)}}}}\n".format(page.title(withNamespace=True), datetime.datetime.utcnow().isoformat())
     sandbox_page.text += u"<nowiki>{}</nowiki>".format(page.text)
     sandbox_page.save(summary=SUMMARY)
+    return True
+
+def load_checkpoint(path):
+    """Returns the checkpoint left by an unfinished run, or an empty one."""
+    try:
+        with open(path) as checkpoint_file:
+            return json.load(checkpoint_file)
+    except (IOError, ValueError):
+        return {"done": [], "activity": {}}
+
+def save_checkpoint(path, checkpoint):
+    """Writes the checkpoint out, all at once."""
+    with open(path + ".tmp", "w") as checkpoint_file:
+        json.dump(checkpoint, checkpoint_file)
+    os.rename(path + ".tmp", path)
+
+def main():
+    site = pywikibot.Site("en", "wikipedia")
+    site.login()
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("pages", nargs="*", help="The titles (with namespace) of the pages to process.")
+    parser.add_argument("-c", "--category", help="Also process every page in this category.")
+    parser.add_argument("-w", "--workers", type=int, default=4,
+                        help="How many pages to look for participants lists in at once.")
+    parser.add_argument("--checkpoint", default=CHECKPOINT,
+                        help="Where to record progress, so an interrupted run can pick up where it left off.")
+    parser.add_argument("--fresh", action="store_true",
+                        help="Ignore the progress recorded by an earlier run.")
+    args = parser.parse_args()
+
+    pages = [pywikibot.Page(site, title) for title in args.pages]
+    if args.category:
+        category = pywikibot.Category(site, args.category)
+        pages.extend(category.members())
+    if not pages:
+        parser.error("Give at least one page or a category.")
+
+    checkpoint = {"done": [], "activity": {}} if args.fresh else load_checkpoint(args.checkpoint)
+    done = set(checkpoint["done"])
+    pages = [page for page in pages if page.title(withNamespace=True) not in done]
+    if done:
+        print("Resuming; {} pages were done already.".format(len(done)))
+
+    def locate(page):
+        if not page.exists():
+            print("{} doesn't exist! Skipping.".format(page.title(withNamespace=True).encode("utf-8")))
+            return None
+        return locate_participants_list(page)
+
+    pool = ThreadPool(max(1, min(args.workers, len(pages))))
+    try:
+        lists = [(page, found) for page, found in zip(pages, pool.map(locate, pages))]
+    finally:
+        pool.close()
+        pool.join()
+
+    # Everyone on every list gets looked up up front, and only once; the
+    # answers are checkpointed a chunk at a time as they come in
+    resolver = ActivityResolver(make_api(site), THREE_MONTHS_AGO)
+    resolver.cache.update((name, tuple(value)) for name, value in checkpoint["activity"].items())
+    checkpoint["activity"] = resolver.cache
+    usernames = sorted(set(entry.username for _, found in lists if found
+                           for entry in found[1]))
+    for start in range(0, len(usernames), RESOLVE_CHUNK):
+        resolver.resolve(usernames[start:start + RESOLVE_CHUNK])
+        save_checkpoint(args.checkpoint, checkpoint)
+
+    for page, found in lists:
+        if found:
+            list_page, entries = found
+            write_sandbox(site, resolver, list_page, entries)
+        checkpoint["done"].append(page.title(withNamespace=True))
+        save_checkpoint(args.checkpoint, checkpoint)
+
+    # Nothing left to resume
+    if os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
 
 if __name__ == "__main__":
     main()
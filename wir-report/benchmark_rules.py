@@ -0,0 +1,108 @@
+"""
+Scores a corpus of articles with rules.py and with the scorer wir-report
+used to have (one uncompiled re.search per rule), checks the scores are the
+same, and prints how long each took.
+
+The rules and the corpus can be files saved beforehand (the rule page's
+wikitext, and a directory of .txt files with one article's wikitext each);
+otherwise they're fetched: the Womeninred rules, and the articles in
+Category:Candidates for speedy deletion.
+"""
+import argparse
+import io
+import os
+import os.path
+import re
+import sys
+import time
+
+from rules import RULES_PAGE, AlexNewArtBotResult, rePattern
+
+CATEGORY = u'Category:Candidates for speedy deletion'
+
+def legacy_patterns( rules_text ):
+  """How AlexNewArtBotResult used to read the rules."""
+  patterns = []
+  gotThreshold = False
+  for line in rules_text.splitlines():
+    if not gotThreshold:
+      gotThreshold = True
+    else:
+      match = rePattern.match( line )
+      if not match is None:
+        patterns.append( ( int( match.group( 1 ) ), match.group( 2 ) ) )
+  return patterns
+
+def legacy_score( patterns, page_text ):
+  """How AlexNewArtBotResult.score used to work."""
+  score = 0
+  for ( value, pattern ) in patterns:
+    if pattern == r'\whe\w': pattern = r'\she\s'
+    if pattern == r'\w(man|men|male)': pattern = r'\s(man|men|male)'
+    if re.search( pattern, page_text, re.IGNORECASE ) is not None:
+      score = score + value
+  return score
+
+def load_corpus( directory ):
+  corpus = []
+  for filename in sorted( os.listdir( directory ) ):
+    if filename.endswith( '.txt' ):
+      with io.open( os.path.join( directory, filename ), encoding='utf-8' ) as article_file:
+        corpus.append( ( filename[:-4], article_file.read() ) )
+  return corpus
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument( 'corpus', nargs='?', help='Directory of saved articles (.txt).' )
+  parser.add_argument( '--rules', help='File with the wikitext of a rule page.' )
+  parser.add_argument( '--rules-name', default='Womeninred',
+                       help='Which rule page to fetch, if --rules isn\'t given.' )
+  parser.add_argument( '-n', '--repeat', type=int, default=3,
+                       help='How many times to score the corpus with each scorer.' )
+  args = parser.parse_args()
+
+  if not args.rules or not args.corpus:
+    import pywikibot
+    site = pywikibot.Site()
+  if args.rules:
+    with io.open( args.rules, encoding='utf-8' ) as rules_file:
+      rules_text = rules_file.read()
+  else:
+    rules_text = pywikibot.Page( site, RULES_PAGE + args.rules_name ).text
+  if args.corpus:
+    corpus = load_corpus( args.corpus )
+  else:
+    corpus = [ ( page.title(), page.text ) for page
+               in pywikibot.Category( site, CATEGORY ).articles( namespaces=( 0 ) ) ]
+
+  start = time.time()
+  rules = AlexNewArtBotResult( rules_text )
+  print( '{} rules ({} literals, {} regexes) read in {:.3f} s.'.format(
+      len( rules.patterns ), len( rules.literals ), len( rules.regexes ), time.time() - start ) )
+  print( '{} articles, {:.1f} MB.'.format(
+      len( corpus ), sum( len( text ) for _, text in corpus ) / 1e6 ) )
+
+  patterns = legacy_patterns( rules_text )
+  timings = {}
+  for name, score in ( ( 'legacy', lambda text: legacy_score( patterns, text ) ),
+                       ( 'rules.py', rules.score ) ):
+    best = None
+    for _ in range( args.repeat ):
+      start = time.time()
+      scores = [ score( text ) for _, text in corpus ]
+      elapsed = time.time() - start
+      best = elapsed if best is None else min( best, elapsed )
+    timings[ name ] = ( best, scores )
+    print( '{:10} {:8.3f} s'.format( name, best ) )
+
+  wrong = [ ( title, old, new ) for ( title, _ ), old, new
+            in zip( corpus, timings[ 'legacy' ][ 1 ], timings[ 'rules.py' ][ 1 ] ) if old != new ]
+  for title, old, new in wrong:
+    print( u'Different score for {}: {} before, {} now'.format( title, old, new ).encode( 'utf-8' ) )
+  if wrong:
+    sys.exit( 1 )
+  print( 'All scores identical; {:.1f}x faster.'.format(
+      timings[ 'legacy' ][ 0 ] / max( timings[ 'rules.py' ][ 0 ], 1e-9 ) ) )
+
+if __name__ == '__main__':
+  main()
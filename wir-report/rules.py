@@ -0,0 +1,121 @@
+"""
+Reads one of AlexNewArtBot's rule pages (User:AlexNewArtBot/<name>) and
+scores text against its rules: each rule is a value and a regex, and a
+text's score is the sum of the values of the rules that match it.
+
+Rules that are plain text (most of them) are looked for all at once, in a
+single pass over the text with an Aho-Corasick automaton; the rest are
+compiled once, when the page is read.
+"""
+import re
+import string
+
+RULES_PAGE = 'User:AlexNewArtBot/'
+
+reThreshold = re.compile( r'^  @@(\d+)@@' )
+rePattern = re.compile( r'^ (-?\d+) /([^/]*)/' )
+
+# Patterns on the rule pages that are replaced before being used
+REWRITES = { r'\whe\w': r'\she\s', r'\w(man|men|male)': r'\s(man|men|male)' }
+
+# Text with no special characters, except ones escaped with a backslash
+LITERAL = re.compile( r'^(?:[^\\.^$*+?{}\[\]()|]|\\[^0-9A-Za-z])+$' )
+ESCAPE = re.compile( r'\\(.)' )
+
+# re.IGNORECASE without re.UNICODE only folds ASCII letters, so that's all
+# the literals and the text are folded with
+ASCII_LOWER = dict( ( ord( upper ), ord( lower ) ) for upper, lower
+                    in zip( string.ascii_uppercase, string.ascii_lowercase ) )
+
+class Automaton:
+  """
+  An Aho-Corasick automaton over some strings, for finding which of them
+  occur in a text.
+  """
+
+  def __init__( self, keywords ):
+    # goto[state] maps a character to the next state; fail[state] is the
+    # state for the longest proper suffix that's also a prefix of some
+    # keyword; out[state] is the indices of the keywords ending there
+    self.goto = [ {} ]
+    self.fail = [ 0 ]
+    self.out = [ frozenset() ]
+    for index, keyword in enumerate( keywords ):
+      state = 0
+      for character in keyword:
+        if character not in self.goto[ state ]:
+          self.goto[ state ][ character ] = len( self.goto )
+          self.goto.append( {} )
+          self.fail.append( 0 )
+          self.out.append( frozenset() )
+        state = self.goto[ state ][ character ]
+      self.out[ state ] = self.out[ state ] | frozenset( [ index ] )
+
+    # Breadth-first, so a state's fail state is done before it is
+    queue = list( self.goto[ 0 ].values() )
+    for state in queue:
+      for character, next_state in self.goto[ state ].items():
+        queue.append( next_state )
+        fallback = self.fail[ state ]
+        while fallback and character not in self.goto[ fallback ]:
+          fallback = self.fail[ fallback ]
+        self.fail[ next_state ] = self.goto[ fallback ].get( character, 0 )
+        self.out[ next_state ] = self.out[ next_state ] | self.out[ self.fail[ next_state ] ]
+
+  def find( self, text ):
+    """Returns the set of the indices of the keywords that occur in the text."""
+    goto, fail, out = self.goto, self.fail, self.out
+    found = set()
+    state = 0
+    for character in text:
+      while state and character not in goto[ state ]:
+        state = fail[ state ]
+      state = goto[ state ].get( character, 0 )
+      if out[ state ]:
+        found.update( out[ state ] )
+    return found
+
+class AlexNewArtBotResult:
+
+  def __init__( self, rules_text ):
+    self.threshold = 10
+    self.patterns = []
+    gotThreshold = False
+    for line in rules_text.splitlines():
+      if not gotThreshold:
+        match = reThreshold.match( line )
+        if not match is None:
+          self.threshold = int( match.group( 1 ) )
+        gotThreshold = True
+      else:
+        match = rePattern.match( line )
+        if not match is None:
+          value = int( match.group( 1 ) )
+          pattern = match.group( 2 )
+          self.patterns.append( ( value, REWRITES.get( pattern, pattern ) ) )
+
+    # Literals are looked for (case-folded) with the automaton, everything
+    # else with its own compiled regex
+    literal_values = {}
+    self.regexes = []
+    self.always = 0
+    for ( value, pattern ) in self.patterns:
+      if not pattern:
+        self.always += value
+      elif LITERAL.match( pattern ):
+        literal = ESCAPE.sub( r'\1', pattern ).translate( ASCII_LOWER )
+        literal_values[ literal ] = literal_values.get( literal, 0 ) + value
+      else:
+        self.regexes.append( ( value, re.compile( pattern, re.IGNORECASE ) ) )
+    self.literals = sorted( literal_values )
+    self.literal_values = [ literal_values[ literal ] for literal in self.literals ]
+    self.automaton = Automaton( self.literals )
+
+  def score( self, page_text ):
+    score = self.always
+    for index in self.automaton.find( page_text.translate( ASCII_LOWER ) ):
+      score = score + self.literal_values[ index ]
+    for ( value, regex ) in self.regexes:
+      if regex.search( page_text ) is not None:
+        score = score + value
+    return score
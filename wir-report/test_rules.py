@@ -0,0 +1,43 @@
+import re
+import unittest
+
+from rules import AlexNewArtBotResult, Automaton
+
+RULES = u"""  @@15@@
+ 10 /actress/
+ 5 /she\\./
+ 3 /Women's/
+ -2 /\\whe\\w/
+ 4 /born \\d{4}/
+not a rule
+ 1 /actress/
+"""
+
+class TestAutomaton(unittest.TestCase):
+    def test_overlapping(self):
+        automaton = Automaton([u"he", u"she", u"his", u"hers"])
+        self.assertEqual(automaton.find(u"ushers"), set([0, 1, 3]))
+        self.assertEqual(automaton.find(u"hi"), set())
+
+class TestRules(unittest.TestCase):
+    def setUp(self):
+        self.rules = AlexNewArtBotResult(RULES)
+
+    def test_parse(self):
+        self.assertEqual(self.rules.threshold, 15)
+        self.assertEqual(len(self.rules.patterns), 6)
+        self.assertEqual(self.rules.literals, [u"actress", u"she.", u"women's"])
+        self.assertEqual(len(self.rules.regexes), 2)
+
+    def test_score_matches_regexes(self):
+        for text in [u"An ACTRESS, she. is", u"She was born 1950", u"the shed",
+                     u"Women's rights", u"womens", u"a he b", u""]:
+            expected = sum(value for value, pattern in self.rules.patterns
+                           if re.search(pattern, text, re.IGNORECASE))
+            self.assertEqual(self.rules.score(text), expected, text)
+
+    def test_duplicate_rules_add_up(self):
+        self.assertEqual(self.rules.score(u"actress"), 11)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,11 +1,14 @@
 import sys
 import datetime
+import heapq
+from multiprocessing.pool import ThreadPool
 import re
 import pywikibot
 from pywikibot import pagegenerators
+from pywikibot.data.api import Request
+
+from rules import RULES_PAGE, AlexNewArtBotResult
 
-reThreshold = re.compile( '^  @@(\d+)@@' )
-rePattern = re.compile( '^ (-?\d+) /([^/]*)/' )
 CSD_SUMMARY = re.compile(r"CSD|(^|\s+)(G|A)\d\d?($|[^\d])|db-\w|Nominated\spage\sfor\sdeletion")
 CSD_RULE_SUMMARY = re.compile(r"((?:G|A)\d\d?)|(db-.+)(?:\||\}\})")
 CSD_TEMPLATE = re.compile(r"\{\{(db-\w+).+?\}\}")
@@ -14,79 +17,81 @@ REPORT_PAGE = "User:EnterpriseyBot/WiR report"
 SUMMARY = "Bot generating report for WiR"
 
 NUM_ARTICLES = 10
+BATCH_SIZE = 50 # Article texts fetched per request
+RECENT_REVISIONS = 50 # How far back in each history to look for the CSD tagging
+WORKERS = 4
 catName = u'Category:Candidates for speedy deletion'
 rulesName = 'Womeninred'
 if len( sys.argv ) > 1:
   rulesName = sys.argv[ 1 ]
 
-class AlexNewArtBotResult:
-
-  threshold = 10
-  patterns = []
-
-  def __init__( self, rule ):
-    page = pywikibot.Page( site, 'User:AlexNewArtBot/' + rule )
-    gotThreshold = False
-    for line in page.text.splitlines():
-      if not gotThreshold:
-        match = reThreshold.match( line )
-        if not match is None:
-          self.threshold = int( match.group( 1 ) )
-        gotThreshold = True
-      else:
-        match = rePattern.match( line )
-        if not match is None:
-          value = int( match.group( 1 ) )
-          pattern = match.group( 2 )
-          self.patterns.append( ( value, pattern ) )
-
-  def score( self, page_text ):
-    score = 0
-    for ( value, pattern ) in self.patterns:
-      if pattern == r'\whe\w': pattern = r'\she\s'
-      if pattern == r'\w(man|men|male)': pattern = r'\s(man|men|male)'
-      if re.search( pattern, page_text, re.IGNORECASE ) is not None:
-        score = score + value
-    return score
-
 class Article:
-  def __init__(self, page_object):
-    self.page_object = page_object
-    self.title = page_object.title(withNamespace=True)
-    self.text = page_object.get()
-    self.score = rules.score(self.text)
+  def __init__(self, title, text, score):
+    self.title = title
+    self.text = text
+    self.score = score
 
   def get_csd_reason(self):
     if self.title == "Fortifications at Mycenae": print self.text
     match = CSD_TEMPLATE.search(self.text)
     return match.group(1) if match else None
 
-  def get_csd_rev(self):
-    csd_revs = (rev for rev in self.page_object.revisions()
-        if CSD_SUMMARY.search(rev.comment))
-    try:
-      return next(csd_revs)
-    except StopIteration:
-      return None
+  def get_csd_time(self):
+    """
+    When the most recent of the page's last few revisions with a CSD-looking
+    summary was made, or None.
+    """
+    response = Request(site=site, action="query", prop="revisions",
+        titles=self.title, rvprop="comment|timestamp", rvlimit=RECENT_REVISIONS,
+        formatversion=2).submit()
+    for page in response.get(u"query", {}).get(u"pages", []):
+      for rev in page.get(u"revisions", []):
+        if CSD_SUMMARY.search(rev.get(u"comment", u"")):
+          return pywikibot.Timestamp.fromISOformat(rev[u"timestamp"])
+    return None
+
+def top_articles(pages, n):
+  """
+  The n highest-scoring pages as Articles, best first; pages with the same
+  score stay in the order they came in. Only the texts of the n best so far
+  are kept.
+  """
+  heap = []
+  for index, page in enumerate(pages):
+    text = page.get()
+    entry = (rules.score(text), -index, page.title(withNamespace=True), text)
+    if len(heap) < n:
+      heapq.heappush(heap, entry)
+    elif entry > heap[0]:
+      heapq.heapreplace(heap, entry)
+  return [Article(title, text, score)
+      for score, _, title, text in sorted(heap, reverse=True)]
 
 site = pywikibot.Site()
-rules = AlexNewArtBotResult( rulesName )
+rules = AlexNewArtBotResult( pywikibot.Page( site, RULES_PAGE + rulesName ).text )
 
 cat = pywikibot.Category( site, catName )
 
-# Find scores for each article in the category
-articles = [Article(page) for page in cat.articles(namespaces=(0))]
-articles.sort(key=lambda a: a.score, reverse=True)
-articles = articles[:NUM_ARTICLES]
+# Find scores for each article in the category, as the texts come in
+pages = pagegenerators.PreloadingGenerator(cat.articles(namespaces=(0)),
+    groupsize=BATCH_SIZE)
+articles = top_articles(pages, NUM_ARTICLES)
+
+# Look for when the winners were tagged, a few at a time
+pool = ThreadPool(WORKERS)
+try:
+  csd_times = pool.map(Article.get_csd_time, articles)
+finally:
+  pool.close()
+  pool.join()
 
 # Upload to the wiki
 content = ""
 content += "== CSD alerts =="
 now = datetime.datetime.utcnow()
-for each_article in articles:
-  csd_rev = each_article.get_csd_rev()
-  if csd_rev:
-    deletion_delta = now - csd_rev.timestamp
+for each_article, csd_time in zip(articles, csd_times):
+  if csd_time:
+    deletion_delta = now - csd_time
     age_in_hours = float(deletion_delta.total_seconds())/3600
     formatted_age = "{:.1f} hours ago".format(age_in_hours)
     reason = each_article.get_csd_reason()